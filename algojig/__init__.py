@@ -1,18 +1,44 @@
-import base64
-from pprint import pprint
+"""
+Public names are imported lazily on first access so `import algojig` stays cheap.
+The ledger, programs and algosdk are only imported when they are first used.
+"""
+import importlib
 
-from algosdk.account import generate_account
-from algosdk.transaction import SuggestedParams
-from algosdk.encoding import encode_address
+# public name -> submodule
+_lazy_names = {
+    'TealProgram': '.teal',
+    'TealishProgram': '.tealish',
+    'LogicEvalError': '.exceptions',
+    'LogicSigReject': '.exceptions',
+    'JigLedger': '.ledger',
+}
 
+__all__ = [
+    *_lazy_names,
+    'get_suggested_params',
+    'generate_accounts',
+    'dump',
+    'print_logs',
+]
 
-from .teal import TealProgram  # noqa
-from .tealish import TealishProgram  # noqa
-from .exceptions import LogicEvalError, LogicSigReject  # noqa
-from .ledger import JigLedger  # noqa
+
+def __getattr__(name):
+    if name in _lazy_names:
+        module = importlib.import_module(_lazy_names[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 def get_suggested_params():
+    import base64
+    from algosdk.transaction import SuggestedParams
+
     sp = SuggestedParams(
         fee=1000,
         first=1,
@@ -25,6 +51,8 @@ def get_suggested_params():
 
 
 def generate_accounts(n=10):
+    from algosdk.account import generate_account
+
     addresses = []
     secrets = []
     for _ in range(n):
@@ -35,6 +63,8 @@ def generate_accounts(n=10):
 
 
 def _dump(d):
+    from algosdk.encoding import encode_address
+
     if isinstance(d, bytes):
         if len(d) == 32:
             return encode_address(d)
@@ -56,6 +86,8 @@ def _dump(d):
 
 
 def dump(*d):
+    from pprint import pprint
+
     if len(d) == 1:
         d = d[0]
     pprint(_dump(d), indent=2)
@@ -0,0 +1,25 @@
+from functools import lru_cache
+
+from algosdk import encoding, logic
+
+# Each address conversion does base32 and a SHA-512/256 checksum, and app addresses a SHA-512/256 hash.
+# The ledger converts the same few addresses on every eval so the results are interned here.
+CACHE_SIZE = 2 ** 18
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode_address(public_key):
+    """Cached algosdk.encoding.encode_address. Returns None for None."""
+    return encoding.encode_address(public_key)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def decode_address(address):
+    """Cached algosdk.encoding.decode_address. Returns None for None."""
+    return encoding.decode_address(address)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_application_address(app_id):
+    """Cached algosdk.logic.get_application_address."""
+    return logic.get_application_address(app_id)
@@ -0,0 +1,120 @@
+from array import array
+
+ZERO_ADDRESS = bytes(32)
+
+# Columns of flatten_blocks stored in array.array('Q') or array('q'). The others are lists.
+INT_COLUMNS = {
+    'round': 'Q',
+    'parent': 'q',
+    'depth': 'Q',
+    'fee': 'Q',
+    'amount': 'Q',
+    'asset_id': 'Q',
+    'app_id': 'Q',
+    'log_count': 'Q',
+    'inner_count': 'Q',
+}
+COLUMNS = ['round', 'path', 'parent', 'depth', 'type', 'sender', 'receiver', 'fee', 'amount', 'asset_id', 'app_id',
+           'log_count', 'inner_count']
+
+
+def iter_transactions(block):
+    """
+    Yield (path, stxn) for every transaction of an evaluated block, including inner transactions.
+    `path` is a tuple of indexes: (2,) is the third transaction of the block and (2, 0) is its first inner transaction.
+    """
+    stack = [((i,), stxn) for i, stxn in enumerate(block.get(b'txns', []))]
+    stack.reverse()
+    while stack:
+        path, stxn = stack.pop()
+        yield path, stxn
+        inner_txns = stxn.get(b'dt', {}).get(b'itx', [])
+        stack.extend(((*path, i), itxn) for i, itxn in reversed(list(enumerate(inner_txns))))
+
+
+def get_receiver(stxn):
+    """The receiver of a payment or asset transfer, or None."""
+    txn = stxn[b'txn']
+    return txn.get(b'rcv') or txn.get(b'arcv')
+
+
+def get_asset_id(stxn):
+    """The asset transferred, configured or frozen by a transaction, including created assets, or 0."""
+    txn = stxn[b'txn']
+    return txn.get(b'xaid') or txn.get(b'caid') or txn.get(b'faid') or stxn.get(b'caid', 0)
+
+
+def get_app_id(stxn):
+    """The app called by a transaction, including created apps, or 0."""
+    return stxn[b'txn'].get(b'apid') or stxn.get(b'apid', 0)
+
+
+def flatten_blocks(blocks):
+    """
+    Flatten one or many evaluated blocks to a columnar table with one row per transaction, including inner
+    transactions, in execution order. Returns {column name: column} with the columns in COLUMNS.
+
+    Integer columns are array.array so they can be used as NumPy arrays without copying (see `to_numpy`).
+    `parent` is the row index of the outer transaction or -1. `sender` and `receiver` are 32 byte public keys;
+    the receiver is ZERO_ADDRESS for transactions without one. `amount` is in microalgos for payments and in
+    base units for asset transfers. `asset_id` and `app_id` include created assets and apps.
+    """
+    if isinstance(blocks, dict):
+        blocks = [blocks]
+    columns = {name: array(INT_COLUMNS[name]) if name in INT_COLUMNS else [] for name in COLUMNS}
+    (rounds, paths, parents, depths, types, senders, receivers, fees, amounts, asset_ids, app_ids,
+     log_counts, inner_counts) = (columns[name] for name in COLUMNS)
+    for block in blocks:
+        rnd = block.get(b'rnd', 0)
+        # row index of each path in this block, to find parents
+        rows = {}
+        for path, stxn in iter_transactions(block):
+            txn = stxn[b'txn']
+            dt = stxn.get(b'dt', {})
+            txn_type = txn.get(b'type', b'')
+            if txn_type == b'pay':
+                receiver = txn.get(b'rcv', ZERO_ADDRESS)
+                amount = txn.get(b'amt', 0)
+            elif txn_type == b'axfer':
+                receiver = txn.get(b'arcv', ZERO_ADDRESS)
+                amount = txn.get(b'aamt', 0)
+            else:
+                receiver = ZERO_ADDRESS
+                amount = 0
+            rows[path] = len(paths)
+            rounds.append(rnd)
+            paths.append(path)
+            parents.append(rows[path[:-1]] if len(path) > 1 else -1)
+            depths.append(len(path) - 1)
+            types.append(txn_type.decode())
+            senders.append(txn.get(b'snd', ZERO_ADDRESS))
+            receivers.append(receiver)
+            fees.append(txn.get(b'fee', 0))
+            amounts.append(amount)
+            asset_ids.append(get_asset_id(stxn))
+            app_ids.append(get_app_id(stxn))
+            log_counts.append(len(dt.get(b'lg', ())))
+            inner_counts.append(len(dt.get(b'itx', ())))
+    return columns
+
+
+def to_numpy(columns):
+    """
+    Convert the columns of a flattened table to NumPy arrays. array.array columns are wrapped without copying,
+    lists of bytes become fixed width bytes arrays and other lists become object arrays. Requires numpy.
+    """
+    import numpy as np
+
+    result = {}
+    for name, column in columns.items():
+        if isinstance(column, array):
+            result[name] = np.frombuffer(column, dtype=np.dtype(column.typecode)) if len(column) else \
+                np.zeros(0, dtype=np.dtype(column.typecode))
+        elif column and isinstance(column[0], bytes):
+            result[name] = np.array(column, dtype=bytes)
+        elif column and isinstance(column[0], str):
+            result[name] = np.array(column, dtype=str)
+        else:
+            # the extra None keeps tuples (paths) from being converted to a 2D array
+            result[name] = np.array(column + [None], dtype=object)[:-1]
+    return result
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import tempfile
+from bisect import bisect_left, insort
+from types import MappingProxyType
+
+
+def box_kv_key(app_id, key):
+    return b'bx:' + app_id.to_bytes(8, 'big') + key
+
+
+def split_box_kv_key(kv_key):
+    return int.from_bytes(kv_key[3:11], 'big'), kv_key[11:]
+
+
+class MemoryBoxStore(dict):
+    """The default box store. It is a dict of app_id -> {key: bytearray} so existing code
+    that reads `ledger.boxes` directly keeps working.
+    It is read-only, as are the per-app dicts: boxes are changed with set_box and delete_box,
+    which keep the box stats and sorted keys up to date.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # app_id -> {key: bytearray}, exposed read-only as self[app_id]
+        self._boxes = {}
+        # app_id -> [box count, total bytes of keys and values]
+        self.stats = {}
+        # app_id -> sorted list of box keys, for range and prefix scans
+        self.sorted_keys = {}
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('MemoryBoxStore is read-only, use set_box and delete_box')
+
+    __setitem__ = __delitem__ = __ior__ = setdefault = update = pop = popitem = clear = _read_only
+
+    def get_box(self, app_id, key):
+        return self[app_id][key]
+
+    def set_box(self, app_id, key, value):
+        if type(value) is not bytearray:
+            value = bytearray(value)
+        boxes = self._boxes.get(app_id)
+        if boxes is None:
+            boxes = self._boxes[app_id] = {}
+            dict.__setitem__(self, app_id, MappingProxyType(boxes))
+        stats = self.stats.setdefault(app_id, [0, 0])
+        if key in boxes:
+            stats[1] += len(value) - len(boxes[key])
+            # use slicing to mutate the existing object
+            boxes[key][:] = value[:]
+        else:
+            stats[0] += 1
+            stats[1] += len(key) + len(value)
+            boxes[key] = value
+            insort(self.sorted_keys.setdefault(app_id, []), key)
+
+    def delete_box(self, app_id, key):
+        value = self._boxes[app_id].pop(key)
+        stats = self.stats[app_id]
+        stats[0] -= 1
+        stats[1] -= len(key) + len(value)
+        keys = self.sorted_keys[app_id]
+        del keys[bisect_left(keys, key)]
+
+    def box_exists(self, app_id, key):
+        return key in self.get(app_id, {})
+
+    def get_box_keys(self, app_id, start=None, end=None):
+        """Returns the sorted keys of the app's boxes, optionally only those in [start, end)."""
+        keys = self.sorted_keys.get(app_id, [])
+        i = bisect_left(keys, start) if start is not None else 0
+        j = bisect_left(keys, end) if end is not None else len(keys)
+        return keys[i:j]
+
+    def get_box_stats(self, app_id):
+        count, size = self.stats.get(app_id, (0, 0))
+        return count, size
+
+    def iter_boxes(self):
+        for app_id, boxes in self.items():
+            for key, value in boxes.items():
+                yield app_id, key, value
+
+    def apply_box_mods(self, mods):
+        """Apply box modifications keyed by kvstore key. A None value deletes the box."""
+        for kv_key, value in mods.items():
+            app_id, key = split_box_kv_key(kv_key)
+            if value is None:
+                if self.box_exists(app_id, key):
+                    self.delete_box(app_id, key)
+            else:
+                self.set_box(app_id, key, value)
+
+    def write_kvstore(self, db):
+        q = 'INSERT INTO kvstore (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value'
+        db.executemany(q, ((box_kv_key(app_id, key), value or b"") for app_id, key, value in self.iter_boxes()))
+
+
+class SqliteBoxStore:
+    """A box store that keeps box contents in a sqlite file instead of the Python heap.
+
+    Boxes are stored with the same key layout as the ledger's kvstore table so they can be
+    copied into the jig ledger with a single INSERT ... SELECT.
+    Reads return memoryviews; use `read_box` to read a slice of a large box without loading all of it.
+    """
+
+    def __init__(self, filename=None):
+        self.temporary = filename is None
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='jig_boxes_', suffix='.sqlite')
+            os.close(fd)
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.execute('CREATE TABLE IF NOT EXISTS kvstore (key BLOB PRIMARY KEY, value BLOB)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS boxstats (app_id INTEGER PRIMARY KEY, count INTEGER, size INTEGER)')
+        self.db.commit()
+
+    def __contains__(self, app_id):
+        return self.get_box_stats(app_id)[0] > 0
+
+    def _app_range(self, app_id):
+        return box_kv_key(app_id, b''), box_kv_key(app_id + 1, b'')
+
+    def _add_stats(self, app_id, count, size):
+        q = (
+            'INSERT INTO boxstats (app_id, count, size) VALUES (?, ?, ?) '
+            'ON CONFLICT(app_id) DO UPDATE SET count=count+excluded.count, size=size+excluded.size'
+        )
+        self.db.execute(q, [app_id, count, size])
+
+    def _get_length(self, kv_key):
+        row = self.db.execute('SELECT length(value) FROM kvstore WHERE key = ?', [kv_key]).fetchone()
+        return None if row is None else row[0]
+
+    def get_box(self, app_id, key):
+        row = self.db.execute('SELECT value FROM kvstore WHERE key = ?', [box_kv_key(app_id, key)]).fetchone()
+        if row is None:
+            raise KeyError((app_id, key))
+        return memoryview(row[0])
+
+    def read_box(self, app_id, key, offset=0, size=None):
+        row = self.db.execute('SELECT rowid FROM kvstore WHERE key = ?', [box_kv_key(app_id, key)]).fetchone()
+        if row is None:
+            raise KeyError((app_id, key))
+        with self.db.blobopen('kvstore', 'value', row[0], readonly=True) as blob:
+            blob.seek(offset)
+            return memoryview(blob.read(-1 if size is None else size))
+
+    def set_box(self, app_id, key, value):
+        kv_key = box_kv_key(app_id, key)
+        old_length = self._get_length(kv_key)
+        self.db.execute(
+            'INSERT INTO kvstore (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value',
+            [kv_key, bytes(value)]
+        )
+        if old_length is None:
+            self._add_stats(app_id, 1, len(key) + len(value))
+        else:
+            self._add_stats(app_id, 0, len(value) - old_length)
+
+    def delete_box(self, app_id, key):
+        kv_key = box_kv_key(app_id, key)
+        old_length = self._get_length(kv_key)
+        if old_length is None:
+            raise KeyError((app_id, key))
+        self.db.execute('DELETE FROM kvstore WHERE key = ?', [kv_key])
+        self._add_stats(app_id, -1, -(len(key) + old_length))
+
+    def box_exists(self, app_id, key):
+        return self._get_length(box_kv_key(app_id, key)) is not None
+
+    def get_box_keys(self, app_id, start=None, end=None):
+        """Returns the sorted keys of the app's boxes, optionally only those in [start, end)."""
+        lo, hi = self._app_range(app_id)
+        if start is not None:
+            lo = box_kv_key(app_id, start)
+        if end is not None:
+            hi = box_kv_key(app_id, end)
+        q = 'SELECT key FROM kvstore WHERE key >= ? AND key < ? ORDER BY key'
+        return [k[11:] for (k,) in self.db.execute(q, [lo, hi])]
+
+    def get_box_stats(self, app_id):
+        row = self.db.execute('SELECT count, size FROM boxstats WHERE app_id = ?', [app_id]).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    def iter_boxes(self):
+        for kv_key, value in self.db.execute('SELECT key, value FROM kvstore ORDER BY key'):
+            app_id, key = split_box_kv_key(kv_key)
+            yield app_id, key, memoryview(value)
+
+    def apply_box_mods(self, mods):
+        """Apply box modifications keyed by kvstore key. A None value deletes the box."""
+        for kv_key, value in mods.items():
+            app_id, key = split_box_kv_key(kv_key)
+            if value is None:
+                if self.box_exists(app_id, key):
+                    self.delete_box(app_id, key)
+            else:
+                self.set_box(app_id, key, value)
+
+    def flush(self):
+        self.db.commit()
+
+    def write_kvstore(self, db):
+        self.flush()
+        # ATTACH is not allowed inside a transaction
+        db.commit()
+        db.execute('ATTACH DATABASE ? AS boxstore', [self.filename])
+        db.execute(
+            'INSERT INTO main.kvstore (key, value) SELECT key, value FROM boxstore.kvstore WHERE true '
+            'ON CONFLICT(key) DO UPDATE SET value=excluded.value'
+        )
+        db.commit()
+        db.execute('DETACH DATABASE boxstore')
+
+    def close(self):
+        self.db.close()
+        if self.temporary:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.filename + suffix)
+                except FileNotFoundError:
+                    pass
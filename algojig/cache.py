@@ -0,0 +1,68 @@
+import os
+import tempfile
+from pathlib import Path
+
+from algosdk.encoding import msgpack
+
+
+def default_cache_dir():
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'algojig'
+
+
+class EvalCache:
+    """
+    An on-disk cache of eval results keyed by a hash of the ledger state and the evaluated transactions.
+    Entries are evicted least recently used first once the total size exceeds `max_size` bytes.
+    """
+
+    def __init__(self, path=None, max_size=256 * 1024 * 1024):
+        if path is None:
+            path = default_cache_dir() / 'evals'
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    def _filename(self, key):
+        return self.path / f'{key}.msgpack'
+
+    def get(self, key):
+        filename = self._filename(key)
+        try:
+            data = filename.read_bytes()
+        except FileNotFoundError:
+            return None
+        # The modification time is used as the last access time for eviction
+        os.utime(filename)
+        return msgpack.unpackb(data, raw=False, strict_map_key=False, use_list=True)
+
+    def set(self, key, result):
+        filename = self._filename(key)
+        # a unique temporary file so concurrent writers of the same key don't clobber each other
+        fd, tmp_filename = tempfile.mkstemp(dir=self.path, prefix=f'{key}.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(msgpack.packb(result, use_bin_type=True))
+        os.replace(tmp_filename, filename)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.msgpack'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+        entries.sort()
+        for _, size, filename in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.msgpack'):
+                os.remove(entry.path)
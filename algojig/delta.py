@@ -0,0 +1,98 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from algosdk.transaction import OnComplete
+
+from .blocks import iter_transactions
+from .boxes import split_box_kv_key
+
+
+def decode_state(tkv):
+    """Decode a msgpack TealKeyValue map to {key: bytes or int}."""
+    state = {}
+    for k, v in tkv.items():
+        state[k] = v.get(b'tb') if v[b'tt'] == 1 else v.get(b'ui', 0)
+    return state
+
+
+def diff_state(old, new):
+    """Returns {key: (old value, new value)} for changed keys. Missing keys are None."""
+    changes = {}
+    for k in old.keys() | new.keys():
+        old_value, new_value = old.get(k), new.get(k)
+        if old_value != new_value:
+            changes[k] = (old_value, new_value)
+    return changes
+
+
+@dataclass
+class StateDelta:
+    # (address, asset_id) -> (old amount, new amount). None means the account does not hold the asset.
+    balances: Dict[Tuple[str, int], Tuple] = field(default_factory=dict)
+    # app_id -> {key: (old value, new value)}
+    global_states: Dict[int, Dict] = field(default_factory=dict)
+    # (address, app_id) -> {key: (old value, new value)}
+    local_states: Dict[Tuple[str, int], Dict] = field(default_factory=dict)
+    # (app_id, key) -> value
+    created_boxes: Dict[Tuple[int, bytes], bytes] = field(default_factory=dict)
+    updated_boxes: Dict[Tuple[int, bytes], bytes] = field(default_factory=dict)
+    deleted_boxes: List[Tuple[int, bytes]] = field(default_factory=list)
+    created_assets: List[int] = field(default_factory=list)
+    deleted_assets: List[int] = field(default_factory=list)
+    created_apps: List[int] = field(default_factory=list)
+    deleted_apps: List[int] = field(default_factory=list)
+
+    def get_balance_change(self, address, asset_id=0):
+        old, new = self.balances.get((address, asset_id), (0, 0))
+        return (new or 0) - (old or 0)
+
+
+def compute_state_delta(ledger, block, updated_accounts, box_mods):
+    """
+    Compute the StateDelta of an eval result before it is applied to the ledger.
+    Only the accounts and boxes changed by the block are compared with the ledger state.
+    """
+    delta = StateDelta()
+    for _, stxn in iter_transactions(block):
+        txn = stxn[b'txn']
+        if stxn.get(b'caid'):
+            delta.created_assets.append(stxn[b'caid'])
+        elif txn.get(b'type') == b'acfg' and txn.get(b'caid') and not txn.get(b'apar'):
+            delta.deleted_assets.append(txn[b'caid'])
+        if stxn.get(b'apid'):
+            delta.created_apps.append(stxn[b'apid'])
+        elif txn.get(b'type') == b'appl' and txn.get(b'apan') == OnComplete.DeleteApplicationOC:
+            delta.deleted_apps.append(txn[b'apid'])
+
+    for address, data in updated_accounts.items():
+        account = ledger.accounts.get(address, {'balances': {}, 'local_states': {}})
+
+        new_balances = {0: data.get(b'algo', 0)}
+        for asset_id, holding in data.get(b'asset', {}).items():
+            new_balances[asset_id] = holding.get(b'a', 0)
+        old_balances = {asset_id: b[0] for asset_id, b in account['balances'].items()}
+        for asset_id, (old, new) in diff_state(old_balances, new_balances).items():
+            delta.balances[(address, asset_id)] = (old, new)
+
+        new_local_states = {app_id: decode_state(d.get(b'tkv', {})) for app_id, d in data.get(b'appl', {}).items()}
+        for app_id in account['local_states'].keys() | new_local_states.keys():
+            changes = diff_state(account['local_states'].get(app_id, {}), new_local_states.get(app_id, {}))
+            if changes:
+                delta.local_states[(address, app_id)] = changes
+
+        for app_id, params in data.get(b'appp', {}).items():
+            changes = diff_state(ledger.global_states.get(app_id, {}), decode_state(params.get(b'gs', {})))
+            if changes:
+                delta.global_states[app_id] = changes
+
+    for kv_key, value in box_mods.items():
+        app_id, key = split_box_kv_key(kv_key)
+        exists = ledger.box_exists(app_id, key)
+        if value is None:
+            if exists:
+                delta.deleted_boxes.append((app_id, key))
+        elif exists:
+            delta.updated_boxes[(app_id, key)] = value
+        else:
+            delta.created_boxes[(app_id, key)] = value
+    return delta
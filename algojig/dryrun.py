@@ -1,11 +1,21 @@
 import base64
+import http.client
+import json
+import re
+import warnings
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
 import algosdk
+from algosdk.constants import algod_auth_header
+from algosdk.error import AlgodHTTPError
 from algosdk.transaction import SuggestedParams
 from algosdk.v2client import models
-from algosdk.v2client.algod import AlgodClient
-from algosdk.encoding import encode_address
+from algosdk.v2client.algod import AlgodClient, api_version_path_prefix
+from algosdk.encoding import msgpack
+from .addresses import encode_address
+from .exceptions import AppCallReject as LedgerAppCallReject, LogicEvalError
+from .ledger import JigLedger
 from .program import read_program
 from .teal import TealProgram
 
@@ -29,6 +39,27 @@ class AppCallResponse:
     local_deltas: Dict
 
 
+class LocalModeWarning(UserWarning):
+    """Raised for results that the local backend of AVM can't produce like algod's dryrun."""
+
+
+# AppCallResponse fields that come from the dryrun opcode trace
+TRACE_FIELDS = {'cost', 'stack'}
+
+
+class LocalAppCallResponse(AppCallResponse):
+    """
+    An AppCallResponse of the local backend. The jig evaluator doesn't produce an opcode trace,
+    so `cost` and `stack` are None and reading them warns with LocalModeWarning.
+    """
+
+    def __getattribute__(self, name):
+        if name in TRACE_FIELDS:
+            warnings.warn(f'AppCallResponse.{name} is not available without algod: there is no opcode trace',
+                          LocalModeWarning, stacklevel=2)
+        return super().__getattribute__(name)
+
+
 class AppCallReject(Exception):
     def __init__(self, result) -> None:
         self.message = 'AppCall Reject'
@@ -48,15 +79,79 @@ sp = SuggestedParams(
     gh=base64.b64encode(b'\x9b\x01\x08\xe3\xf2Q-6\x1f\xd9\x01z\x9c\x07\x8a`\xe3\x8dR\xc5D\xe9<W\xeb\xd89\xa9\xb9\xdfw@')
 )
 
+LATEST_TIMESTAMP = 1656680532
+
+
+def encode_model(model):
+    """
+    Encode a model as msgpack_encode encodes it inside a list in a request.
+    Only the top level map of a request is made canonical, list items are packed as they are.
+    """
+    return msgpack.packb(model.dictify(), use_bin_type=True)
+
+
+class AlgodSession:
+    """Sends requests to algod over a single keep-alive connection instead of a new connection per request."""
 
-class AVM:
     def __init__(self, algod: AlgodClient):
+        url = urlparse(algod.algod_address)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.host = url.netloc
+        self.path_prefix = url.path.rstrip('/') + api_version_path_prefix
+        self.headers = {'User-Agent': 'py-algorand-sdk'}
+        self.headers.update(algod.headers or {})
+        self.headers[algod_auth_header] = algod.algod_token
+        self.connection = None
+
+    def post(self, path, data, headers):
+        headers = dict(self.headers, **headers)
+        # Retry once in case the server closed the idle connection
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.host, timeout=30)
+            try:
+                self.connection.request('POST', self.path_prefix + path, body=data, headers=headers)
+                response = self.connection.getresponse()
+                body = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self.close()
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise AlgodHTTPError(body.decode(errors='replace'), response.status)
+        return body
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class AVM:
+    def __init__(self, algod: Optional[AlgodClient] = None):
+        """
+        With an AlgodClient app calls are evaluated with algod's dryrun endpoint.
+        Without one they are evaluated locally by the jig ledger. Local mode is not a drop-in replacement:
+        - there is no opcode trace, so results are LocalAppCallResponses whose `cost` and `stack` are None
+          and warn when they are read, and print_response can't be used
+        - a failure reason is 'Error in program: pc <pc>, line <teal line no>: <teal line>; <error>',
+          using the TEAL source map, instead of the algod format with tealish lines
+        - signatures and logic sigs are not checked, so logic sig groups always pass; they warn
+        """
         self.algod = algod
+        self.session = AlgodSession(algod) if algod is not None else None
         self.apps = {}
         self.accounts = {}
         self.assets = {}
         self.logs = []
         self.creator_sk, self.creator = algosdk.account.generate_account()
+        # msgpack encoded dryrun request models, invalidated when the state they encode changes
+        self._account_models = {}
+        self._app_models = None
+        self._creator_models = None
+        # the JigLedger of the local backend, invalidated with the models
+        self._ledger = None
 
     def set_app(self, app_id, approval_filename=None, approval_program=None):
         if approval_program is None:
@@ -66,7 +161,10 @@ class AVM:
             'approval_program': approval_program,
             'creator': self.creator,
         }
-    
+        self._app_models = None
+        self._creator_models = None
+        self._ledger = None
+
     def get_balance(self, address, asset_id=0):
         if address not in self.accounts:
             return 0
@@ -80,6 +178,7 @@ class AVM:
         if asset_id and asset_id not in self.assets:
             self.create_asset(asset_id=asset_id)
         self.accounts[address]['balances'][asset_id] = balance
+        self._account_changed(address)
 
     def create_asset(self, params={}, asset_id=None):
         if asset_id is None:
@@ -93,6 +192,8 @@ class AVM:
             asset_id = caid
         if asset_id and asset_id not in self.assets:
             self.assets[asset_id] = params
+            self._creator_models = None
+            self._ledger = None
         if 'creator' in params:
             self.set_account_balance(params['creator'], params['total'], asset_id=asset_id)
         return asset_id
@@ -101,20 +202,28 @@ class AVM:
         self.accounts[address]['local_states'][app_id] = state
         if state is None:
             del self.accounts[address]['local_states'][app_id]
+        self._account_changed(address)
 
     def set_account_auth_addr(self, address, auth_addr):
         self.accounts[address]['auth_addr'] = auth_addr
+        self._account_changed(address)
+
+    def _account_changed(self, address):
+        self._account_models.pop(address, None)
+        self._ledger = None
 
     def log(self, log):
         self.logs.append(log)
 
     def move(self, from_address, to_address, asset_id, amount):
         self.accounts[from_address]['balances'][asset_id] -= amount
+        self._account_changed(from_address)
         if to_address not in self.accounts:
             self.set_account_balance(to_address, 0)
         if asset_id not in self.accounts[to_address]['balances']:
             raise Exception(f'Account {to_address} not opted into asset {asset_id}')
         self.accounts[to_address]['balances'][asset_id] += amount
+        self._account_changed(to_address)
 
     def optin_asset(self, address, asset_id):
         self.set_account_balance(address, 0, asset_id)
@@ -123,6 +232,11 @@ class AVM:
         self.move(encode_address(txn[b'txn'][b'snd']), 'A7NMWS3NT3IUDMLVO26ULGXGIIOUQ3ND2TXSER6EBGRZNOBOUIQXHIBGDE', 0, txn[b'txn'].get(b'fee', 0))
 
     def eval_transactions(self, txn_group):
+        # All app calls of the group are evaluated at once from the state before the group
+        results = self.app_calls(txn_group)
+        for result in results.values():
+            if result.result != 'PASS':
+                raise AppCallReject(result)
         txns = []
         for i, stxn in enumerate(txn_group):
             s = algosdk.encoding.msgpack_encode(stxn)
@@ -130,10 +244,7 @@ class AVM:
             txns.append(d)
             self.preprocess_transaction(d)
             if d[b'txn'][b'type'] == b'appl':
-                result = self._app_call(txn_group, i)
-                if result.result != 'PASS':
-                    raise AppCallReject(result)
-                d[b'dt'] = result.response.get(b'apply-data', {}).get(b'dt', {})
+                d[b'dt'] = results[i].response.get(b'apply-data', {}).get(b'dt', {})
             self.process_transaction(d)
         return txns
 
@@ -176,41 +287,169 @@ class AVM:
                 txn[b'caid'] = caid
 
     def dryrun2(self, drr):
-        req = "/teal/dryrun2"
         headers = {"Content-Type": "application/msgpack"}
-        data = algosdk.encoding.msgpack_encode(drr)
-        data = base64.b64decode(data)
-        return self.algod.algod_request("POST", req, data=data, response_format='msgpack', headers=headers)
-    
+        if isinstance(drr, bytes):
+            data = drr
+        else:
+            data = base64.b64decode(algosdk.encoding.msgpack_encode(drr))
+        return self.session.post("/teal/dryrun2", data, headers)
+
+    def dryrun(self, drr):
+        """Post a msgpack encoded dryrun request to algod's dryrun endpoint. Returns the decoded JSON response."""
+        headers = {"Content-Type": "application/msgpack"}
+        return json.loads(self.session.post("/teal/dryrun", drr, headers))
+
+    def app_calls(self, txn_group):
+        """
+        Evaluate all app calls of a group. Returns a dict of transaction index -> AppCallResponse.
+        The group is evaluated once, by the local backend or with a single algod dryrun request built from
+        the cached encoded state, and the results are split by transaction index.
+        algod's dryrun doesn't report inner transactions, so their effects are not applied to the AVM state
+        by eval_transactions and `inner_txns` is empty.
+        """
+        app_call_indexes = [i for i, stxn in enumerate(txn_group) if stxn.transaction.type == 'appl']
+        if self.algod is None:
+            return self._local_group_call(txn_group, app_call_indexes)
+        if not app_call_indexes:
+            return {}
+        return self._dryrun_group(txn_group, app_call_indexes)
+
     def app_call(self, txn_group, transaction_index):
-        return self._app_call(txn_group, transaction_index)
-
-    def _app_call(self, txn_group, transaction_index):
-        apps = [
-            models.Application(
-                id=a['app_id'],
-                params=models.ApplicationParams(
-                    creator=a['creator'],
-                    approval_program=a['approval_program'].bytecode,
-                    clear_state_program='',
-                    local_state_schema=models.ApplicationStateSchema(16, 16),
-                    global_state_schema=models.ApplicationStateSchema(64, 64),
-                ),
-            )
-        for a in self.apps.values()]
-
-        accounts = [
-            models.Account(
+        if self.algod is None:
+            return self._local_app_call(txn_group, transaction_index)
+        return self._dryrun_group(txn_group, [transaction_index])[transaction_index]
+
+    def make_ledger(self):
+        """
+        Returns a JigLedger with the current AVM state. Signatures are not checked, like dryrun.
+        It is built once and reused until the state changes. Evals only simulate on it.
+        """
+        if self._ledger is None:
+            self._ledger = self._build_ledger()
+        return self._ledger
+
+    def _build_ledger(self):
+        ledger = JigLedger()
+        ledger.verify_signatures = False
+        ledger.creator_sk, ledger.creator = self.creator_sk, self.creator
+        ledger.set_account_balance(self.creator, 10_000_000)
+        for asset_id, params in self.assets.items():
+            ledger.create_asset(asset_id, dict(params))
+        for a in self.accounts.values():
+            address = a['address']
+            ledger.set_account_balance(address, a['balances'].get(0, 0))
+            for asset_id, amount in a['balances'].items():
+                ledger.set_account_balance(address, amount, asset_id=asset_id)
+            for app_id, state in a['local_states'].items():
+                ledger.set_local_state(address, app_id, state)
+            if a.get('auth_addr'):
+                ledger.set_auth_addr(address, a['auth_addr'])
+        for app_id, app in self.apps.items():
+            ledger.create_app(app_id, approval_program=app['approval_program'], creator=app['creator'])
+        return ledger
+
+    def _local_app_call(self, txn_group, transaction_index):
+        results = self._local_group_call(txn_group, [transaction_index])
+        # If another transaction of the group failed its result is returned instead
+        return results.get(transaction_index) or next(iter(results.values()))
+
+    def _local_group_call(self, txn_group, app_call_indexes):
+        if any(getattr(stxn, 'lsig', None) is not None for stxn in txn_group):
+            warnings.warn('logic sigs are not evaluated without algod', LocalModeWarning, stacklevel=3)
+        results = {i: self._new_response(txn_group) for i in app_call_indexes}
+        ledger = self.make_ledger()
+        try:
+            block = ledger.simulate_transactions(txn_group, block_timestamp=LATEST_TIMESTAMP)['block']
+        except (LogicEvalError, LedgerAppCallReject) as e:
+            # The group fails as a whole so only the failing app call gets a (REJECT) result
+            if isinstance(e, LogicEvalError):
+                txn_id = e.txn_id
+            else:
+                txn_id = next(iter(re.findall('transaction ([0-9A-Z]+):', e.reason)), None)
+            txn_ids = [stxn.get_txid() for stxn in txn_group]
+            if txn_id in txn_ids:
+                index = txn_ids.index(txn_id)
+            else:
+                # the error can't be attributed to a transaction
+                index = app_call_indexes[-1] if app_call_indexes else 0
+            result = results.get(index) or self._new_response(txn_group)
+            result.result = 'REJECT'
+            if isinstance(e, LogicEvalError):
+                source = e.source or {}
+                result.error = e.error
+                result.reason = f'Error in program: pc {source.get("pc")}, line {source.get("line_no")}: {source.get("line")}; {e.error}'
+            else:
+                result.error = str(e)
+                result.reason = 'REJECT from program'
+            return {index: result}
+
+        for i, result in results.items():
+            self._set_apply_data(result, txn_group[i], block[b'txns'][i].get(b'dt', {}))
+        return results
+
+    def _new_response(self, txn_group):
+        return LocalAppCallResponse(
+            response={'txn_group': txn_group},
+            result='PASS',
+            error='',
+            reason=None,
+            stack=None,
+            cost=None,
+            inner_txns=[],
+            logs=[],
+            local_deltas={},
+            global_delta={},
+        )
+
+    def _set_apply_data(self, result, stxn, apply_data):
+        result.response[b'apply-data'] = {b'dt': apply_data}
+        result.inner_txns = apply_data.get(b'itx', [])
+        result.logs = apply_data.get(b'lg', [])
+        result.global_delta = apply_data.get(b'gd', {})
+        for i, delta in apply_data.get(b'ld', {}).items():
+            if i == 0:
+                addr = stxn.transaction.sender
+            else:
+                addr = stxn.transaction.accounts[i - 1]
+            result.local_deltas[addr] = delta
+        result.reason = 'PASS from program'
+
+    def _get_app_models(self):
+        """Returns the app models and their msgpack encodings."""
+        if self._app_models is None:
+            apps = [
+                models.Application(
+                    id=a['app_id'],
+                    params=models.ApplicationParams(
+                        creator=a['creator'],
+                        approval_program=a['approval_program'].bytecode,
+                        clear_state_program='',
+                        local_state_schema=models.ApplicationStateSchema(16, 16),
+                        global_state_schema=models.ApplicationStateSchema(64, 64),
+                    ),
+                )
+                for a in self.apps.values()
+            ]
+            self._app_models = apps, [encode_model(a) for a in apps]
+        return self._app_models
+
+    def _get_account_model(self, address):
+        model = self._account_models.get(address)
+        if model is None:
+            a = self.accounts[address]
+            model = encode_model(models.Account(
                 address=a['address'],
                 amount=a['balances'][0],
                 amount_without_pending_rewards=a['balances'][0],
                 auth_addr=a.get('auth_addr'),
                 status='Online',
                 apps_local_state=[
-                    models.ApplicationLocalState(id=i, schema=models.ApplicationStateSchema(16, 16), 
+                    models.ApplicationLocalState(
+                        id=i,
+                        schema=models.ApplicationStateSchema(16, 16),
                         key_value=[
                             models.TealKeyValue(base64.b64encode(k).decode(), models.TealValue(type=2, uint=v) if type(v) == int else models.TealValue(type=1, bytes=v))
-                             for (k,v) in a['local_states'][i].items()
+                            for (k, v) in a['local_states'][i].items()
                         ]
                     )
                     for i in a['local_states']
@@ -221,99 +460,91 @@ class AVM:
                         'asset-id': id,
                     } for id in a['balances'] if id > 0
                 ],
-
-            )
-        for a in self.accounts.values()]
-
-        models.AssetHolding
-
-        accounts.append(models.Account(
-            address='BLITMUHUPIO33MDDVQHUOYTGDUXRSGY2SDSY76DZDYEC5C2S7ZISLPMROQ',
-            amount=10_000_000,
-            amount_without_pending_rewards=10_000_000,
-            status='Online',
-            created_assets=[
-                models.Asset(aid, models.AssetParams()) for aid in self.assets
+            ))
+            self._account_models[address] = model
+        return model
+
+    def _get_creator_models(self):
+        if self._creator_models is None:
+            self._creator_models = [
+                encode_model(models.Account(
+                    address='BLITMUHUPIO33MDDVQHUOYTGDUXRSGY2SDSY76DZDYEC5C2S7ZISLPMROQ',
+                    amount=10_000_000,
+                    amount_without_pending_rewards=10_000_000,
+                    status='Online',
+                    created_assets=[
+                        models.Asset(aid, models.AssetParams()) for aid in self.assets
+                    ]
+                )),
+                encode_model(models.Account(
+                    address=self.creator,
+                    amount=10_000_000,
+                    amount_without_pending_rewards=10_000_000,
+                    status='Online',
+                    created_apps=self._get_app_models()[0],
+                )),
             ]
-        ))
-
-        accounts.append(models.Account(
-            address=self.creator,
-            amount=10_000_000,
-            amount_without_pending_rewards=10_000_000,
-            status='Online',
-            created_apps=apps,
-        ))
-
-        drr = {
-            'accounts': [x.dictify() for x in accounts],
-            'txns': [x.dictify() for x in txn_group],
-            'apps': [x.dictify() for x in apps],
-            'txn-index': transaction_index,
-            'latest-timestamp': 1656680532,
-        }
-
-        response = self.dryrun2(drr)
-        response = algosdk.encoding.msgpack.unpackb(response, raw=True, strict_map_key=False)
-        # print(response.get('apply-data'))
-
+        return self._creator_models
+
+    def _encode_dryrun_request(self, txn_group, transaction_index=0):
+        """
+        Build the msgpack encoded dryrun request from the cached encoded models.
+        Only accounts and apps changed since the last request are encoded again.
+        """
+        packer = msgpack.Packer(use_bin_type=True)
+        accounts = [self._get_account_model(address) for address in self.accounts] + self._get_creator_models()
+        apps = self._get_app_models()[1]
+        txns = [stxn if isinstance(stxn, bytes) else encode_model(stxn) for stxn in txn_group]
+        # The top level map is canonical msgpack: sorted keys and no zero values
+        fields = [
+            ('accounts', packer.pack_array_header(len(accounts)) + b''.join(accounts)),
+            ('apps', packer.pack_array_header(len(apps)) + b''.join(apps) if apps else None),
+            ('latest-timestamp', packer.pack(LATEST_TIMESTAMP)),
+            ('txn-index', packer.pack(transaction_index) if transaction_index else None),
+            ('txns', packer.pack_array_header(len(txns)) + b''.join(txns)),
+        ]
+        fields = [(k, v) for (k, v) in fields if v is not None]
+        return packer.pack_map_header(len(fields)) + b''.join(packer.pack(k) + v for (k, v) in fields)
+
+    def _dryrun_group(self, txn_group, app_call_indexes):
+        response = self.dryrun(self._encode_dryrun_request(txn_group))
+        if response.get('error'):
+            raise Exception(response['error'])
         response['txn_group'] = txn_group
-        txn = response[b'debug']
-        apply_data = response.get(b'apply-data', {}).get(b'dt', {})
-        # print(apply_data)
-        if response[b'error']:
-            raise Exception(response[b'error'])
+        return {i: self._dryrun_result(response, txn_group, i) for i in app_call_indexes}
+
+    def _dryrun_result(self, response, txn_group, transaction_index):
+        txn = response['txns'][transaction_index]
+        messages = txn.get('app-call-messages') or []
+        trace = txn.get('app-call-trace') or []
+        logs = [base64.b64decode(log) for log in txn.get('logs') or []]
         result = AppCallResponse(
-            response=response,
-            result=txn[b'app-call-messages'][1].decode(),
-            error=txn[b'app-call-messages'][-1].decode(),
+            response={**response, b'apply-data': {b'dt': {b'lg': logs}}},
+            result=messages[1] if len(messages) > 1 else 'REJECT',
+            error=messages[-1] if messages else '',
             reason=None,
-            stack=[],
-            cost=txn[b'cost'],
-            inner_txns = apply_data.get(b'itx', []),
-            logs=[],
-            local_deltas={},
-            global_delta={},
+            stack=trace[-1]['stack'] if trace else [],
+            cost=txn.get('cost', 0),
+            inner_txns=[],
+            logs=logs,
+            global_delta={base64.b64decode(d['key']): d['value'] for d in txn.get('global-delta') or []},
+            local_deltas={ld['address']: ld['delta'] for ld in txn.get('local-deltas') or []},
         )
-        # logs = [base64.b64decode(l) for l in txn.get('logs', [])]
-        # txn['logs'] = logs
-        # for l in logs:
-        #     if b'%i' in l:
-        #         i = l.index(b'%i')
-        #         s = l[0:i].decode()
-        #         value = int.from_bytes(l[i+2:], 'big')
-        #         result.logs.append(f'Log: {s}: {value}')
-        #     else:
-        #         result.logs.append(f'Log: {l}')
-        # for d in txn.get('global-delta', []):
-        #     result.global_delta[base64.b64decode(d['key'])] = d['value']
-
-        for ld in apply_data.get(b'ld', {}),:
-            delta = {}
-            for i in ld:
-                if i == 0:
-                    addr = txn_group[transaction_index].transaction.sender
-                else:
-                    addr = txn_group[transaction_index].transaction.accounts[i - 1]
-                result.local_deltas[addr] = ld[i]
-
         app_id = txn_group[transaction_index].transaction.index
         program = self.apps[app_id]['approval_program']
-        eval_result = txn[b'app-call-messages'][1].decode()
-        if txn[b'app-call-trace'][-1].get(b'error'):
-            line = txn[b'app-call-trace'][-1][b'line'] + 1
-            error = txn[b'app-call-trace'][-1][b'error'].decode()
+        if trace and trace[-1].get('error'):
+            line = trace[-1]['line'] + 1
             teal_line, tealish_line = program.source_map[line]
-            result.reason = f'Error in program: {line}, teal: {teal_line}, tealish: {tealish_line}; {error}'
-            result.stack = txn[b'app-call-trace'][-1][b'stack']
-        else:
-            line = txn[b'app-call-trace'][-2][b'line']
+            result.reason = f'Error in program: {line}, teal: {teal_line}, tealish: {tealish_line}; {trace[-1]["error"]}'
+        elif len(trace) > 1:
+            line = trace[-2]['line']
             teal_line, tealish_line = program.source_map[line]
-            result.reason = f'{eval_result} from program: {line}, teal: {teal_line}, tealish: {tealish_line}'
+            result.reason = f'{result.result} from program: {line}, teal: {teal_line}, tealish: {tealish_line}'
         return result
 
-
     def print_response(self, response):
+        if self.algod is None:
+            raise ValueError('print_response needs a dryrun response with a trace, which local mode does not have')
         print('- ' * 40)
         for gi, txn in enumerate(response['txns']):
             if txn.get('logic-sig-messages'):
@@ -0,0 +1,169 @@
+import keyword
+import struct
+from array import array
+from collections import namedtuple
+
+from algosdk.abi import ABIType
+from Cryptodome.Hash import SHA512
+
+from .addresses import encode_address
+from .blocks import iter_transactions
+
+# ABI types that are decoded with a struct format code when every arg of an event has a fixed size
+STRUCT_CODES = {
+    'uint8': 'B',
+    'byte': 'B',
+    'uint16': 'H',
+    'uint32': 'I',
+    'uint64': 'Q',
+    'address': '32s',
+}
+# ABI types stored in array('Q') columns
+INT_TYPES = {'uint8', 'byte', 'uint16', 'uint32', 'uint64'}
+
+# `path` is the position of the transaction in the block, as in blocks.iter_transactions
+EventRecord = namedtuple('EventRecord', ['round', 'path', 'app_id', 'name', 'args'])
+
+# The event name of `name%i` logs
+INT_LOG = '%i'
+
+
+def get_selector(signature):
+    """The first 4 bytes of the SHA-512/256 hash of the event signature, as for ABI methods."""
+    h = SHA512.new(truncate='256')
+    h.update(signature.encode())
+    return h.digest()[:4]
+
+
+class Event:
+    """
+    An ARC-28 event. `signature` is like 'Swap(address,uint64,uint64)'.
+    Decoded args are a namedtuple with the given arg names, or arg0, arg1, ... by default.
+    Arg names that are not valid Python identifiers, like `from`, are replaced by their position (_0, _1, ...).
+    """
+
+    def __init__(self, signature, arg_names=None):
+        self.signature = signature
+        self.name, args = signature.split('(', 1)
+        self.selector = get_selector(signature)
+        self.abi_type = ABIType.from_string('(' + args)
+        self.arg_types = [str(t) for t in self.abi_type.child_types]
+        arg_names = arg_names or [f'arg{i}' for i in range(len(self.arg_types))]
+        typename = self.name if self.name.isidentifier() and not keyword.iskeyword(self.name) else 'EventArgs'
+        self.args_class = namedtuple(typename, arg_names, rename=True)
+
+        self.struct = None
+        if all(t in STRUCT_CODES for t in self.arg_types):
+            self.struct = struct.Struct('>' + ''.join(STRUCT_CODES[t] for t in self.arg_types))
+            self.address_indexes = [i for i, t in enumerate(self.arg_types) if t == 'address']
+
+    @classmethod
+    def from_arc28(cls, event):
+        """Create an Event from an ARC-28 event description: {'name': ..., 'args': [{'type': ..., 'name': ...}]}"""
+        signature = event['name'] + '(' + ','.join(a['type'] for a in event['args']) + ')'
+        return cls(signature, [a.get('name') or f'arg{i}' for i, a in enumerate(event['args'])])
+
+    def decode(self, data):
+        """Decode the ABI encoded args of a log, without the selector."""
+        if self.struct is not None and len(data) == self.struct.size:
+            values = self.struct.unpack(data)
+            if self.address_indexes:
+                values = list(values)
+                for i in self.address_indexes:
+                    values[i] = encode_address(values[i])
+            return self.args_class._make(values)
+        return self.args_class._make(self.abi_type.decode(data))
+
+
+def decode_int_log(log):
+    """Decode a `name%i<uint64>` log to (name, value) or return None."""
+    i = log.find(b'%i')
+    if i == -1:
+        return None
+    return log[:i].decode(errors='replace'), int.from_bytes(log[i + 2:], 'big')
+
+
+class EventDecoder:
+    """
+    Decodes ARC-28 events and `%i` logs from evaluated blocks, including inner transactions.
+
+    Logs are matched against the registered events by their 4 byte selector. Logs that match no event are
+    decoded as `%i` logs if `int_logs` is True, with INT_LOG as the event name and (name, value) as args.
+    Other logs are ignored.
+    """
+
+    def __init__(self, events=(), int_logs=True):
+        self.events = {}
+        self.int_logs = int_logs
+        for event in events:
+            self.register(event)
+
+    def register(self, event):
+        if isinstance(event, str):
+            event = Event(event)
+        elif isinstance(event, dict):
+            event = Event.from_arc28(event)
+        self.events[event.selector] = event
+        return event
+
+    def decode_log(self, log):
+        """Returns (event name, args) or None."""
+        event = self.events.get(log[:4])
+        if event is not None:
+            return event.name, event.decode(log[4:])
+        if self.int_logs:
+            int_log = decode_int_log(log)
+            if int_log is not None:
+                return INT_LOG, int_log
+        return None
+
+    def iter_logs(self, blocks):
+        """Yield (round, path, app_id, log) for every log of the blocks."""
+        if isinstance(blocks, dict):
+            blocks = [blocks]
+        for block in blocks:
+            rnd = block.get(b'rnd', 0)
+            for path, stxn in iter_transactions(block):
+                logs = stxn.get(b'dt', {}).get(b'lg')
+                if not logs:
+                    continue
+                txn = stxn[b'txn']
+                app_id = txn.get(b'apid') or stxn.get(b'apid', 0)
+                for log in logs:
+                    yield rnd, path, app_id, log
+
+    def iter_events(self, blocks):
+        """Yield an EventRecord for every decoded log of the blocks, in execution order."""
+        events = self.events
+        for rnd, path, app_id, log in self.iter_logs(blocks):
+            event = events.get(log[:4])
+            if event is not None:
+                yield EventRecord(rnd, path, app_id, event.name, event.decode(log[4:]))
+            elif self.int_logs:
+                int_log = decode_int_log(log)
+                if int_log is not None:
+                    yield EventRecord(rnd, path, app_id, INT_LOG, int_log)
+
+    def decode_columns(self, blocks, name):
+        """
+        Decode all events called `name` to columns: {'round': ..., 'app_id': ..., 'path': ..., <arg name>: ...}
+        Round, app id and integer args are array('Q'). Other columns are lists.
+        """
+        event = next((e for e in self.events.values() if e.name == name), None)
+        if event is None:
+            raise KeyError(f'Unknown event {name!r}')
+        selector = event.selector
+        columns = {'round': array('Q'), 'app_id': array('Q'), 'path': []}
+        arg_columns = []
+        for field, arg_type in zip(event.args_class._fields, event.arg_types):
+            columns[field] = array('Q') if arg_type in INT_TYPES else []
+            arg_columns.append(columns[field])
+        for rnd, path, app_id, log in self.iter_logs(blocks):
+            if log[:4] != selector:
+                continue
+            columns['round'].append(rnd)
+            columns['app_id'].append(app_id)
+            columns['path'].append(path)
+            for column, value in zip(arg_columns, event.decode(log[4:])):
+                column.append(value)
+        return columns
@@ -9,6 +9,14 @@ class AppCallReject(Exception):
         return self.reason
 
 
+class EvalError(Exception):
+    """The evaluator rejected the transactions. The message is the evaluator's error output."""
+
+    def __init__(self, result) -> None:
+        self.message = 'Eval Error'
+        super().__init__(result)
+
+
 class LogicEvalError(Exception):
     def __init__(self, result, txn_id, error, source) -> None:
         self.message = 'Logic Eval Error'
@@ -37,3 +45,16 @@ class LogicSigReject(Exception):
 
     def __str__(self) -> str:
         return f'{self.error}'
+
+
+class ReplayError(Exception):
+    def __init__(self, position, timestamp, error) -> None:
+        self.message = 'Replay Error'
+        # index of the first group of the failing block in the recording
+        self.position = position
+        self.timestamp = timestamp
+        self.error = error
+        super().__init__(position, timestamp, error)
+
+    def __str__(self) -> str:
+        return f'Block at group {self.position} (timestamp {self.timestamp}) failed: {self.error}'
@@ -1,23 +1,108 @@
 import base64
+import ctypes
+import functools
+import hashlib
 import importlib.resources
 import json
+import os
+import shutil
 import subprocess
+import sys
 from io import BytesIO
 
 from algosdk.encoding import msgpack
 
 import algojig
+from algojig.cache import default_cache_dir
+from algojig.exceptions import EvalError
 
 binary = f'algojig'
+library = 'libalgojig.dylib' if sys.platform == 'darwin' else 'libalgojig.so'
+ledger_dir = '/tmp/jig'
+
+# Prepared genesis ledgers are kept here, one per evaluator version. Defaults to the algojig cache dir.
+template_root = None
+TEMPLATE_TIMESTAMP = 1000
+
+# Evaluate in process through the shared library when it is installed. The binary is the fallback.
+use_library = True
+
+# Set to True to keep the digests of transaction groups that passed signature and logic sig verification
+# in a file in the algojig cache dir, so identical groups are not verified again in later evals.
+use_verified_cache = False
+
+# The verified groups file last passed to the shared library
+_library_verified_cache = None
+
+# The number of compiled programs kept by compile. The least recently used are dropped.
+COMPILE_CACHE_SIZE = 1024
+
+
+def binary_path():
+    return importlib.resources.files(algojig).joinpath(binary)
+
+
+def library_path():
+    return importlib.resources.files(algojig).joinpath(library)
+
+
+@functools.lru_cache()
+def load_library():
+    path = library_path()
+    if not path.is_file():
+        return None
+    lib = ctypes.CDLL(str(path))
+    out = [ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_int)]
+    lib.AlgojigInit.argtypes = [ctypes.c_longlong, *out]
+    lib.AlgojigEval.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int, *out]
+    lib.AlgojigSetVerifiedCache.argtypes = [ctypes.c_char_p, ctypes.c_int, *out]
+    lib.AlgojigCompile.argtypes = [ctypes.c_char_p, ctypes.c_int, *out]
+    lib.AlgojigFree.argtypes = [ctypes.c_void_p]
+    for f in [lib.AlgojigInit, lib.AlgojigEval, lib.AlgojigSetVerifiedCache, lib.AlgojigCompile]:
+        f.restype = ctypes.c_int
+    lib.AlgojigFree.restype = None
+    return lib
+
+
+def get_library():
+    """Returns the loaded shared library or None if the binary should be used."""
+    if not use_library:
+        return None
+    return load_library()
+
+
+def call_library(name, *args):
+    """Call one of the Algojig* C functions. Returns (returncode, output) like a finished process."""
+    lib = get_library()
+    out = ctypes.c_char_p()
+    out_len = ctypes.c_int()
+    returncode = getattr(lib, name)(*args, ctypes.byref(out), ctypes.byref(out_len))
+    try:
+        output = ctypes.string_at(out, out_len.value) if out_len.value else b''
+    finally:
+        lib.AlgojigFree(out)
+    return returncode, output
+
+
+@functools.lru_cache()
+def binary_version():
+    """A hash of the evaluator, used to invalidate cached eval results when it changes."""
+    path = library_path() if get_library() else binary_path()
+    return hashlib.sha256(path.read_bytes()).hexdigest()
 
 
 def run(command, *args, input=None):
-    p = importlib.resources.files(algojig).joinpath(binary)
+    p = binary_path()
     output = subprocess.run([p, command, *args], capture_output=True, input=input)
     return output
 
 
 def init_ledger(block_timestamp):
+    if get_library():
+        returncode, output = call_library('AlgojigInit', int(block_timestamp))
+        if returncode != 0:
+            raise Exception(output)
+        return output
     output = run("init", str(block_timestamp))
     # print(output.stderr.decode())
     if output.returncode != 0:
@@ -25,30 +110,117 @@ def init_ledger(block_timestamp):
     return output
 
 
-def eval():
-    output = run("eval")
+def get_template_dir():
+    """
+    Returns the directory of a genesis ledger prepared by `init`, building it on first use.
+    The protocol is fixed in the evaluator so the template only depends on the evaluator version.
+    """
+    root = template_root or default_cache_dir() / 'templates'
+    path = os.path.join(root, binary_version())
+    if not os.path.isdir(path):
+        init_ledger(TEMPLATE_TIMESTAMP)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        save_ledger(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process built the template first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def init_ledger_from_template():
+    """
+    Copy the cached genesis ledger to the ledger dir.
+    The block timestamp and transaction counter are patched into the block header by the caller.
+    """
+    restore_ledger(get_template_dir())
+
+
+def save_ledger(path):
+    """Copy the prepared ledger databases to `path` so they can be restored before another eval."""
+    shutil.rmtree(path, ignore_errors=True)
+    shutil.copytree(ledger_dir, path)
+
+
+def restore_ledger(path):
+    shutil.rmtree(ledger_dir, ignore_errors=True)
+    shutil.copytree(path, ledger_dir)
+
+
+@functools.lru_cache()
+def verified_cache_path():
+    """The verified groups file of this evaluator version. Verification depends on the consensus protocol."""
+    path = default_cache_dir() / 'verified'
+    path.mkdir(parents=True, exist_ok=True)
+    return str(path / f'{binary_version()}.bin')
+
+
+def set_library_verified_cache(path):
+    global _library_verified_cache
+    if path == _library_verified_cache:
+        return
+    returncode, output = call_library('AlgojigSetVerifiedCache', path.encode(), len(path.encode()))
+    if returncode != 0:
+        raise Exception(output.decode())
+    _library_verified_cache = path
+
+
+# AlgojigEval flags
+EVAL_SKIP_VERIFY = 1
+EVAL_CONTINUE_ON_ERROR = 2
+
+
+def eval(stxns, skip_verify=False, continue_on_error=False):
+    """
+    Evaluate the concatenated msgpack encoded signed transactions in a new block.
+    With `continue_on_error` failing groups are rejected instead of failing the eval
+    and the result includes a status for every group.
+    """
+    verified_cache = verified_cache_path() if use_verified_cache and not skip_verify else ''
+    if get_library():
+        set_library_verified_cache(verified_cache)
+        flags = (EVAL_SKIP_VERIFY if skip_verify else 0) | (EVAL_CONTINUE_ON_ERROR if continue_on_error else 0)
+        returncode, outputs = call_library('AlgojigEval', stxns, len(stxns), flags)
+        if returncode != 0:
+            raise EvalError(outputs.decode())
+        return parse_eval_output(outputs)
+    with open(os.path.join(ledger_dir, 'stxns'), 'wb') as f:
+        f.write(stxns)
+    args = ['--skip-verify'] if skip_verify else []
+    if continue_on_error:
+        args.append('--continue-on-error')
+    if verified_cache:
+        args.append(f'--verified-cache={verified_cache}')
+    output = run("eval", *args)
     if output.returncode == 0:
         # print(output.stderr.decode())
-        outputs = output.stdout
-        accounts = []
-        boxes = {}
-        u = msgpack.Unpacker(BytesIO(outputs), raw=True, strict_map_key=False, use_list=True)
-        data = list(u)
-        block = data[0]
-        # backwards compatibility for gojig binaries that don't output accounts
-        if len(data) > 1:
-            accounts = data[1]
-            boxes = data[2]
-        else:
-            accounts = {}
-        result = {
-            'block': block,
-            'accounts': accounts,
-            'boxes': boxes,
-        }
-        return result
+        return parse_eval_output(output.stdout)
     else:
-        raise Exception(output.stderr.decode())
+        raise EvalError(output.stderr.decode())
+
+
+def parse_eval_output(outputs):
+    accounts = []
+    boxes = {}
+    u = msgpack.Unpacker(BytesIO(outputs), raw=True, strict_map_key=False, use_list=True)
+    data = list(u)
+    block = data[0]
+    # backwards compatibility for gojig binaries that don't output accounts
+    if len(data) > 1:
+        accounts = data[1]
+        boxes = data[2]
+    else:
+        accounts = {}
+    result = {
+        'block': block,
+        'accounts': accounts,
+        'boxes': boxes,
+    }
+    # group statuses in continue on error mode
+    if len(data) > 3:
+        result['statuses'] = data[3]
+    return result
 
 
 def read():
@@ -60,13 +232,31 @@ def read():
 
 
 def compile(filename=None, teal=None):
-    if teal is not None:
-        if type(teal) == str:
-            teal = teal.encode()
-        filename = '-'
-    output = run("compile", filename, input=teal)
-    if output.returncode == 0:
-        program, sourcemap = output.stdout.split(b'\n')
-        return base64.b64decode(program), json.loads(sourcemap)
+    """Returns (bytecode, sourcemap). Results are cached by source so each program is assembled once."""
+    if teal is None:
+        with open(filename, 'rb') as f:
+            teal = f.read()
+    elif type(teal) == str:
+        teal = teal.encode()
+    program, sourcemap = compile_cache(teal)
+    # the sourcemap is mutable so each caller gets its own copy
+    return program, json.loads(sourcemap)
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_cache(teal):
+    return _compile(teal)
+
+
+def _compile(teal):
+    if get_library():
+        returncode, stdout = call_library('AlgojigCompile', teal, len(teal))
+        if returncode != 0:
+            raise Exception(stdout)
     else:
-        raise Exception(output.stderr)
+        output = run("compile", '-', input=teal)
+        if output.returncode != 0:
+            raise Exception(output.stderr)
+        stdout = output.stdout
+    program, sourcemap = stdout.split(b'\n')
+    return base64.b64decode(program), sourcemap
@@ -0,0 +1,152 @@
+import base64
+import os
+import sqlite3
+import tempfile
+from collections import namedtuple
+
+from algosdk.encoding import checksum, msgpack
+
+from .addresses import decode_address
+from .blocks import get_app_id, get_asset_id, get_receiver, iter_transactions
+
+# `block_index` is the position of the block in the history. `txid` is None for inner transactions.
+# `stxn` is the transaction with its apply data but without inner transactions.
+HistoryRecord = namedtuple('HistoryRecord', ['block_index', 'path', 'txid', 'stxn', 'logs'])
+
+
+def decode_txid(txid):
+    """Decode a base32 txid to its 32 bytes."""
+    return base64.b32decode(txid + '=' * (-len(txid) % 8))
+
+
+# Transaction fields that are msgpack strings, including those of asset params. Blocks are decoded with
+# raw=True so map keys and these fields must be converted back from bytes to get the canonical encoding.
+STRING_FIELDS = {'type', 'gen', 'un', 'an', 'au'}
+
+
+def _decode_strings(value):
+    if isinstance(value, dict):
+        d = {}
+        for k, v in sorted(value.items()):
+            k = k.decode()
+            d[k] = v.decode() if k in STRING_FIELDS else _decode_strings(v)
+        return d
+    if isinstance(value, list):
+        return [_decode_strings(v) for v in value]
+    return value
+
+
+def get_block_txid(block, stxn):
+    """The txid of a top level transaction of an evaluated block decoded with raw=True."""
+    txn = dict(stxn[b'txn'])
+    # the genesis hash and id are omitted from transactions in blocks
+    if stxn.get(b'hgh'):
+        txn[b'gh'] = block[b'gh']
+    if stxn.get(b'hgi'):
+        txn[b'gen'] = block[b'gen']
+    return checksum(b'TX' + msgpack.packb(_decode_strings(txn), use_bin_type=True))
+
+
+class HistoryStore:
+    """
+    Keeps evaluated blocks in a sqlite file, one row per transaction including inner transactions,
+    indexed by txid, sender, receiver, app id and asset id. Nothing is kept in memory.
+
+    Every eval of a JigLedger produces the same round number so blocks are numbered by the store.
+    Pass a HistoryStore as JigLedger(history=...) to record every evaluated block.
+    """
+
+    def __init__(self, filename=None):
+        self.temporary = filename is None
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='jig_history_', suffix='.sqlite')
+            os.close(fd)
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS blocks (block_index INTEGER PRIMARY KEY, header BLOB)')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS txns (block_index INTEGER, path TEXT, txid BLOB, type TEXT, sender BLOB, '
+            'receiver BLOB, app_id INTEGER, asset_id INTEGER, stxn BLOB, PRIMARY KEY (block_index, path))'
+        )
+        for column in ['txid', 'sender', 'receiver', 'app_id', 'asset_id']:
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS txns_{column} ON txns ({column}) WHERE {column} IS NOT NULL')
+        self.db.commit()
+
+    def add_block(self, block):
+        """Add an evaluated block. Returns its block index."""
+        header = {k: v for k, v in block.items() if k != b'txns'}
+        block_index = self.db.execute(
+            'INSERT INTO blocks (header) VALUES (?)', [msgpack.packb(header, use_bin_type=True)]
+        ).lastrowid
+        rows = []
+        for path, stxn in iter_transactions(block):
+            txn = stxn[b'txn']
+            txid = get_block_txid(block, stxn) if len(path) == 1 else None
+            # inner transactions are stored in their own rows
+            if b'itx' in stxn.get(b'dt', {}):
+                stxn = {**stxn, b'dt': {k: v for k, v in stxn[b'dt'].items() if k != b'itx'}}
+            rows.append((
+                block_index, '.'.join(map(str, path)), txid, txn.get(b'type', b'').decode(), txn.get(b'snd'),
+                get_receiver(stxn), get_app_id(stxn) or None, get_asset_id(stxn) or None,
+                msgpack.packb(stxn, use_bin_type=True),
+            ))
+        self.db.executemany('INSERT INTO txns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.db.commit()
+        return block_index
+
+    def truncate(self, block_count):
+        """Remove the blocks after the first `block_count`, e.g. to go back to a replay checkpoint."""
+        self.db.execute('DELETE FROM txns WHERE block_index > ?', [block_count])
+        self.db.execute('DELETE FROM blocks WHERE block_index > ?', [block_count])
+        self.db.commit()
+
+    def _record(self, row):
+        block_index, path, txid, stxn = row
+        stxn = msgpack.unpackb(stxn, raw=True, strict_map_key=False)
+        logs = stxn.get(b'dt', {}).get(b'lg', [])
+        path = tuple(int(i) for i in path.split('.'))
+        return HistoryRecord(block_index, path, txid, stxn, logs)
+
+    def get_transaction(self, txid):
+        """Returns the HistoryRecord of a top level transaction by its txid (raw or base32), or None."""
+        if isinstance(txid, str):
+            txid = decode_txid(txid)
+        row = self.db.execute('SELECT block_index, path, txid, stxn FROM txns WHERE txid = ?', [txid]).fetchone()
+        return self._record(row) if row else None
+
+    def find_transactions(self, sender=None, receiver=None, app_id=None, asset_id=None, type=None, limit=None):
+        """Returns the HistoryRecords of the transactions matching all the given filters, in execution order."""
+        conditions = []
+        params = []
+        for column, value in [('sender', sender), ('receiver', receiver)]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(decode_address(value) if isinstance(value, str) else value)
+        for column, value in [('app_id', app_id), ('asset_id', asset_id), ('type', type)]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        q = 'SELECT block_index, path, txid, stxn FROM txns'
+        if conditions:
+            q += ' WHERE ' + ' AND '.join(conditions)
+        q += ' ORDER BY block_index, rowid'
+        if limit is not None:
+            q += f' LIMIT {int(limit)}'
+        return [self._record(row) for row in self.db.execute(q, params)]
+
+    def get_block_header(self, block_index):
+        row = self.db.execute('SELECT header FROM blocks WHERE block_index = ?', [block_index]).fetchone()
+        return msgpack.unpackb(row[0], raw=True, strict_map_key=False) if row else None
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM blocks').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+        if self.temporary:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.filename + suffix)
+                except FileNotFoundError:
+                    pass
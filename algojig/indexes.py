@@ -0,0 +1,126 @@
+from array import array
+
+
+def prefix_end(prefix):
+    """The smallest key greater than every key starting with `prefix`, or None if there is none."""
+    prefix = prefix.rstrip(b'\xff')
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+class Column:
+    """
+    The values of one attribute for a set of accounts, stored contiguously so they can be turned into NumPy
+    arrays without reading the per-account dicts. Rows are unordered; removing a row moves the last row into it.
+    `typecode` makes the values an array.array, otherwise they are a list.
+    """
+
+    def __init__(self, typecode=None):
+        self.addresses = []
+        self.values = array(typecode) if typecode else []
+        # address -> row
+        self.positions = {}
+        # the number of values that are not ints
+        self.non_ints = 0
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def set(self, address, value):
+        i = self.positions.get(address)
+        if i is None:
+            self.positions[address] = len(self.addresses)
+            self.addresses.append(address)
+            self.values.append(value)
+        else:
+            self.non_ints -= type(self.values[i]) is not int
+            self.values[i] = value
+        self.non_ints += type(value) is not int
+
+    def remove(self, address):
+        i = self.positions.pop(address)
+        self.non_ints -= type(self.values[i]) is not int
+        last = len(self.addresses) - 1
+        if i != last:
+            self.addresses[i] = self.addresses[last]
+            self.values[i] = self.values[last]
+            self.positions[self.addresses[i]] = i
+        self.addresses.pop()
+        self.values.pop()
+
+
+class LedgerIndexes:
+    """
+    Secondary indexes over JigLedger accounts: asset holders, accounts opted in to apps and rekeyed accounts,
+    and columns of asset balances and local state values.
+    The ledger calls the `update_*` methods for each holding, opt-in, local state value and auth_addr that
+    changes, so an update costs the same however many assets and apps the account has.
+    """
+
+    def __init__(self):
+        # asset_id -> set of addresses holding or opted in to the asset (asset 0 is algo)
+        self.asset_holders = {}
+        # app_id -> set of addresses opted in to the app
+        self.app_accounts = {}
+        # auth_addr -> set of rekeyed addresses
+        self.rekeyed_accounts = {}
+        # asset_id -> Column of balances
+        self.asset_balances = {}
+        # (app_id, key) -> Column of local state values
+        self.local_state_values = {}
+        # address -> auth_addr as last indexed
+        self.auth_addrs = {}
+
+    def update_holding(self, address, asset_id, holding):
+        """`holding` is [amount, frozen], or None if the account no longer holds the asset."""
+        if holding is None:
+            self._discard(self.asset_holders, asset_id, address)
+            self._remove_value(self.asset_balances, asset_id, address)
+        else:
+            self.asset_holders.setdefault(asset_id, set()).add(address)
+            self._set_value(self.asset_balances, asset_id, address, holding[0], 'Q')
+
+    def update_opt_in(self, address, app_id, opted_in):
+        if opted_in:
+            self.app_accounts.setdefault(app_id, set()).add(address)
+        else:
+            self._discard(self.app_accounts, app_id, address)
+
+    def update_local_state_value(self, address, app_id, key, value):
+        """`value` is None if the account has no value for the key."""
+        if value is None:
+            self._remove_value(self.local_state_values, (app_id, key), address)
+        else:
+            self._set_value(self.local_state_values, (app_id, key), address, value)
+
+    def update_auth_addr(self, address, auth_addr):
+        old_auth_addr = self.auth_addrs.pop(address, None)
+        if old_auth_addr is not None:
+            self._discard(self.rekeyed_accounts, old_auth_addr, address)
+        if auth_addr is not None:
+            self.auth_addrs[address] = auth_addr
+            self.rekeyed_accounts.setdefault(auth_addr, set()).add(address)
+
+    @staticmethod
+    def _discard(index, key, address):
+        addresses = index.get(key)
+        if addresses is not None:
+            addresses.discard(address)
+            if not addresses:
+                del index[key]
+
+    @staticmethod
+    def _set_value(columns, key, address, value, typecode=None):
+        column = columns.get(key)
+        if column is None:
+            column = columns[key] = Column(typecode)
+        column.set(address, value)
+
+    @staticmethod
+    def _remove_value(columns, key, address):
+        column = columns.get(key)
+        if column is not None and address in column.positions:
+            column.remove(address)
+            if not column:
+                del columns[key]
@@ -1,35 +1,159 @@
+import base64
+import hashlib
 import logging
 import re
+import shutil
 import sqlite3
+import tempfile
+from collections import Counter
 
-from algosdk.account import generate_account
-from algosdk.encoding import decode_address, encode_address, msgpack
-from algosdk.transaction import write_to_file
-from algosdk.logic import get_application_address
+from algosdk.account import address_from_private_key, generate_account
+from algosdk.encoding import checksum, msgpack, msgpack_encode
+from algosdk.transaction import Transaction
+from nacl.signing import SigningKey
 
 from . import gojig
-from .exceptions import LogicEvalError, LogicSigReject, AppCallReject
+from .addresses import decode_address, encode_address, get_application_address
+from .boxes import MemoryBoxStore, split_box_kv_key
+from .delta import compute_state_delta, decode_state
+from .exceptions import EvalError, LogicEvalError, LogicSigReject, AppCallReject
+from .indexes import LedgerIndexes, prefix_end
 from .program import read_program
+from .statehash import StateHash
 
 logger = logging.getLogger(__name__)
 
+# MaxTxnBytesPerBlock of the future consensus protocol used by the jig ledger
+MAX_TXN_BYTES_PER_BLOCK = 5 * 1024 * 1024
+# ErrNoSpace of the go-algorand block evaluator
+NO_SPACE_ERROR = 'block does not have space for transaction'
+
+
+def get_creator_account():
+    """
+    The fixed creator of apps and assets used by ledgers with an eval cache, as (private key, address),
+    so identical ledgers have the same state and eval cache keys. Its private key is public.
+    """
+    seed = hashlib.sha256(b'algojig creator').digest()
+    private_key = base64.b64encode(seed + bytes(SigningKey(seed).verify_key)).decode()
+    return private_key, address_from_private_key(private_key)
+
+
+def encode_transaction(stxn):
+    if isinstance(stxn, bytes):
+        return stxn
+    if isinstance(stxn, Transaction):
+        # unsigned transactions are written as a SignedTxn without a signature
+        stxn = {'txn': stxn.dictify()}
+    return base64.b64decode(msgpack_encode(stxn))
+
+
+def get_txid(stxn):
+    if isinstance(stxn, bytes):
+        txn = msgpack.unpackb(stxn)['txn']
+        return base64.b32encode(checksum(b'TX' + msgpack.packb(txn, use_bin_type=True))).decode().strip('=')
+    return stxn.get_txid()
+
+
+def get_app_id(stxn):
+    if isinstance(stxn, bytes):
+        return msgpack.unpackb(stxn)['txn'].get('apid')
+    txn = getattr(stxn, 'transaction', stxn)
+    return getattr(txn, 'index', None)
+
+
+def get_group_id(stxn):
+    if isinstance(stxn, bytes):
+        return msgpack.unpackb(stxn)['txn'].get('grp')
+    txn = getattr(stxn, 'transaction', stxn)
+    return getattr(txn, 'group', None)
+
+
+def get_group_sizes(transactions):
+    """The sizes of the groups the evaluator splits the transactions into by their group ids."""
+    sizes = []
+    first_group_id = None
+    for stxn in transactions:
+        group_id = get_group_id(stxn)
+        if sizes and group_id and group_id == first_group_id:
+            sizes[-1] += 1
+        else:
+            sizes.append(1)
+            first_group_id = group_id
+    return sizes
+
+
+def get_footprint(transactions):
+    """
+    Returns the (addresses, app ids, asset ids, (app id, box name) pairs) the transactions can access,
+    including the accounts of the referenced apps.
+    """
+    addresses, apps, assets, boxes = set(), set(), set(), set()
+    for stxn in transactions:
+        stxn = msgpack.unpackb(encode_transaction(stxn), raw=False)
+        txn = stxn['txn']
+        for field in ('snd', 'rcv', 'close', 'asnd', 'arcv', 'aclose', 'fadd', 'rekey'):
+            if field in txn:
+                addresses.add(encode_address(txn[field]))
+        addresses.update(encode_address(a) for a in txn.get('apat', []))
+        if 'sgnr' in stxn:
+            addresses.add(encode_address(stxn['sgnr']))
+        for field in ('xaid', 'caid', 'faid'):
+            if field in txn:
+                assets.add(txn[field])
+        assets.update(txn.get('apas', []))
+        foreign_apps = txn.get('apfa', [])
+        apps.update(foreign_apps)
+        app_id = txn.get('apid')
+        if app_id:
+            apps.add(app_id)
+        for ref in txn.get('apbx', []):
+            # index 0 is the called app, otherwise 1 + the index of a foreign app
+            i = ref.get('i', 0)
+            box_app_id = foreign_apps[i - 1] if i else app_id
+            if box_app_id:
+                boxes.add((box_app_id, ref.get('n', b'')))
+    addresses.update(get_application_address(app_id) for app_id in apps)
+    return addresses, apps, assets, boxes
+
 
 class JigLedger:
-    def __init__(self):
+    def __init__(self, box_store=None, eval_cache=None, history=None, state_provider=None):
         self.filename = '/tmp/jig/jig_ledger.sqlite3.tracker.sqlite'
         self.block_db_filename = '/tmp/jig/jig_ledger.sqlite3.block.sqlite'
-        self.stxn_filename = '/tmp/jig/stxns'
         self.db = None
         self.block_db = None
         self.apps = {}
-        self.boxes = {}
+        # app_id -> {key: value} by default. Pass a SqliteBoxStore to keep boxes out of memory.
+        self.boxes = box_store if box_store is not None else MemoryBoxStore()
         self.assets = {}
         self.accounts = {}
         self.global_states = {}
         self.raw_accounts = {}
-        self.creator_sk, self.creator = generate_account()
+        # Incrementally updated by the setters. See state_hash().
+        self.state_hasher = StateHash()
+        # Secondary indexes for the query methods, updated with the state hash.
+        self.indexes = LedgerIndexes()
+        # The default creator is random unless eval results are cached. See get_creator_account.
+        self.creator_sk, self.creator = get_creator_account() if eval_cache is not None else generate_account()
         self.set_account_balance(self.creator, 100_000_000)
         self.next_timestamp = 1000
+        self.block_timestamp = None
+        # Set to False to skip signature and logic sig checks, like dryrun does.
+        self.verify_signatures = True
+        # An optional EvalCache. Results of identical (state, transactions) evals are reused from it.
+        self.eval_cache = eval_cache
+        # An optional HistoryStore. Every applied block is added to it.
+        self.history = history
+        self.last_block = None
+        # The StateDelta of the last eval_transactions call
+        self.last_delta = None
+        # An optional StateProvider. The state accessed by evaluated transactions is loaded from it on first use.
+        self.state_provider = state_provider
+        # Keys of the state already requested from the state provider
+        self.provided = set()
+        # app_id -> [count, bytes] of the app's boxes in the state provider that are not loaded
+        self.unloaded_box_stats = {}
 
     def set_account_balance(self, address, balance, asset_id=0, frozen=False):
         if address not in self.accounts:
@@ -37,6 +161,7 @@ class JigLedger:
         if asset_id and asset_id not in self.assets:
             self.create_asset(asset_id)
         self.accounts[address]['balances'][asset_id] = [balance, frozen]
+        self._holding_changed(address, asset_id)
 
     def get_account_balance(self, address, asset_id=0):
         if address not in self.accounts:
@@ -90,6 +215,7 @@ class JigLedger:
             params['unit_name'] = 'TEST'
 
         self.assets[asset_id] = params
+        self._hash_asset(asset_id)
         self.set_account_balance(params['creator'], params['total'], asset_id=asset_id)
         return asset_id
 
@@ -107,34 +233,117 @@ class JigLedger:
             'global_bytes': global_bytes,
             'extra_pages': extra_pages,
         }
+        self._hash_app(app_id)
 
     def set_local_state(self, address, app_id, state):
-        self.accounts[address]['local_states'][app_id] = state
+        local_states = self.accounts[address]['local_states']
+        old_state = local_states.get(app_id)
+        local_states[app_id] = state
         if state is None:
-            del self.accounts[address]['local_states'][app_id]
+            del local_states[app_id]
+        self._local_state_changed(address, app_id, old_state)
 
     def set_global_state(self, app_id, state):
         self.global_states[app_id] = state
+        self._hash_global_state(app_id)
 
     def update_local_state(self, address, app_id, state_delta):
-        self.accounts[address]['local_states'][app_id].update(state_delta)
+        state = self.accounts[address]['local_states'][app_id]
+        old_state = {key: state[key] for key in state_delta if key in state}
+        state.update(state_delta)
+        self._local_state_changed(address, app_id, old_state, state_delta)
 
     def update_global_state(self, app_id, state_delta):
         self.global_states[app_id].update(state_delta)
+        self._hash_global_state(app_id)
 
     def set_box(self, app_id, key, value):
-        if type(value) is not bytearray:
-            value = bytearray(value)
-        if app_id not in self.boxes:
-            self.boxes[app_id] = {}
-        if key in self.boxes[app_id]:
-            # use slicing to mutate the existing object
-            self.boxes[app_id][key][:] = value[:]
-        else:
-            self.boxes[app_id][key] = value
+        if self.boxes.box_exists(app_id, key):
+            self.state_hasher.discard(('box', app_id, key), bytes(self.boxes.get_box(app_id, key)))
+        self.boxes.set_box(app_id, key, value)
+        self.state_hasher.add(('box', app_id, key), bytes(value))
+
+    def delete_box(self, app_id, key):
+        self.state_hasher.discard(('box', app_id, key), bytes(self.boxes.get_box(app_id, key)))
+        self.boxes.delete_box(app_id, key)
 
     def set_auth_addr(self, address, auth_addr):
         self.accounts[address]['auth_addr'] = auth_addr
+        self._auth_addr_changed(address)
+
+    def state_hash(self):
+        """
+        A hash of the accounts, holdings, assets, apps, app state and boxes of the ledger.
+        It is maintained incrementally so it is cheap to call; ledgers with the same state have the same hash.
+        State that is mutated directly instead of through the ledger methods is not reflected in the hash.
+        """
+        return self.state_hasher.hexdigest()
+
+    # The state hash and the indexes have an item per holding, opt-in, local state value and auth_addr,
+    # so a setter costs the same however many assets and apps the account has.
+
+    def _holding_changed(self, address, asset_id):
+        holding = self.accounts[address]['balances'].get(asset_id)
+        self._hash_item(('holding', address, asset_id), holding)
+        self.indexes.update_holding(address, asset_id, holding)
+
+    def _local_state_changed(self, address, app_id, old_state, keys=None):
+        """
+        Called after the app's local state of the account changed from `old_state` (None if not opted in).
+        `keys` are the changed keys, by default the keys of both versions of the state.
+        """
+        state = self.accounts[address]['local_states'].get(app_id)
+        if (old_state is None) != (state is None):
+            self._hash_item(('opt_in', address, app_id), True if state is not None else None)
+            self.indexes.update_opt_in(address, app_id, state is not None)
+        old_state, state = old_state or {}, state or {}
+        for key in (old_state.keys() | state.keys()) if keys is None else keys:
+            value = state.get(key)
+            if old_state.get(key) != value:
+                self._hash_item(('local', address, app_id, key), value)
+                self.indexes.update_local_state_value(address, app_id, key, value)
+
+    def _auth_addr_changed(self, address):
+        auth_addr = self.accounts[address].get('auth_addr')
+        self._hash_item(('auth_addr', address), auth_addr)
+        self.indexes.update_auth_addr(address, auth_addr)
+
+    def _account_changed(self, address, old_account=None):
+        """
+        Called after the account was replaced or added, e.g. by an eval. Only the holdings, local states and
+        auth_addr that differ from `old_account` are updated.
+        """
+        account = self.accounts[address]
+        old_account = old_account or {'balances': {}, 'local_states': {}}
+        old_balances, balances = old_account['balances'], account['balances']
+        for asset_id in old_balances.keys() | balances.keys():
+            if old_balances.get(asset_id) != balances.get(asset_id):
+                self._holding_changed(address, asset_id)
+        old_states, states = old_account['local_states'], account['local_states']
+        for app_id in old_states.keys() | states.keys():
+            if old_states.get(app_id) != states.get(app_id):
+                self._local_state_changed(address, app_id, old_states.get(app_id))
+        if old_account.get('auth_addr') != account.get('auth_addr'):
+            self._auth_addr_changed(address)
+
+    def _hash_item(self, key, value):
+        if value is None:
+            self.state_hasher.remove(key)
+        else:
+            self.state_hasher.set(key, value)
+
+    def _hash_asset(self, asset_id):
+        self.state_hasher.set(('asset', asset_id), sorted(self.assets[asset_id].items()))
+
+    def _hash_app(self, app_id):
+        a = self.apps[app_id]
+        self.state_hasher.set(('app', app_id), [
+            a['creator'], a['approval_program_bytecode'],
+            a['local_ints'], a['local_bytes'], a['global_ints'], a['global_bytes'], a.get('extra_pages', 0),
+        ])
+
+    def _hash_global_state(self, app_id):
+        self.state_hasher.set(('global_state', app_id), sorted(self.global_states[app_id].items()))
 
     def get_global_state(self, app_id):
         return self.global_states[app_id]
@@ -143,69 +352,387 @@ class JigLedger:
         return self.accounts[address]['local_states'][app_id]
 
     def get_box(self, app_id, key):
-        return self.boxes[app_id][key]
+        return self.boxes.get_box(app_id, key)
 
     def box_exists(self, app_id, key):
-        return key in self.boxes.get(app_id, {})
+        return self.boxes.box_exists(app_id, key)
 
     def get_raw_account(self, address):
         return self.raw_accounts.get(address, {})
 
+    def get_asset_holder_addresses(self, asset_id=0, min_balance=0):
+        """Returns the sorted addresses holding at least `min_balance` of the asset, including opted in accounts."""
+        if not min_balance:
+            return sorted(self.indexes.asset_holders.get(asset_id, ()))
+        column = self.indexes.asset_balances.get(asset_id)
+        if column is None:
+            return []
+        return sorted(a for a, balance in zip(column.addresses, column.values) if balance >= min_balance)
+
+    def get_opted_in_addresses(self, app_id):
+        """Returns the sorted addresses opted in to the app."""
+        return sorted(self.indexes.app_accounts.get(app_id, ()))
+
+    def get_rekeyed_addresses(self, auth_addr):
+        """Returns the sorted addresses rekeyed to `auth_addr`."""
+        return sorted(self.indexes.rekeyed_accounts.get(auth_addr, ()))
+
+    def get_box_keys(self, app_id, prefix=None, start=None, end=None):
+        """Returns the sorted keys of the app's boxes, optionally only those with `prefix` or in [start, end)."""
+        if prefix is not None:
+            start, end = prefix, prefix_end(prefix)
+        return self.boxes.get_box_keys(app_id, start=start, end=end)
+
+    def get_asset_holders(self, asset_id=0):
+        """
+        Returns NumPy arrays (addresses, balances) of the accounts holding or opted in to `asset_id`, sorted by address.
+        They are built from the balance column kept by the indexes, not from the account dicts. Requires numpy.
+        """
+        import numpy as np
+
+        column = self.indexes.asset_balances.get(asset_id)
+        if column is None:
+            return np.array([], dtype='U58'), np.array([], dtype=np.uint64)
+        addresses = np.array(column.addresses, dtype='U58')
+        balances = np.frombuffer(column.values, dtype=np.uint64).copy()
+        order = np.argsort(addresses)
+        return addresses[order], balances[order]
+
+    def get_local_state_values(self, app_id, key, default=None):
+        """
+        Returns NumPy arrays (addresses, values) of the `key` local state value of the accounts opted in to `app_id`,
+        sorted by address. Accounts without the key are skipped unless a default is given. Values are uint64 if all
+        of them are ints and bytes objects otherwise. They are built from the local state column kept by the
+        indexes, not from the account dicts. Requires numpy.
+        """
+        import numpy as np
+
+        if type(key) == str:
+            key = key.encode()
+        column = self.indexes.local_state_values.get((app_id, key))
+        addresses = list(column.addresses) if column else []
+        values = list(column.values) if column else []
+        all_ints = not column or not column.non_ints
+        if default is not None:
+            missing = self.indexes.app_accounts.get(app_id, set()).difference(column.positions if column else ())
+            addresses.extend(missing)
+            values.extend([default] * len(missing))
+            all_ints = all_ints and (not missing or type(default) is int)
+        addresses = np.array(addresses, dtype='U58')
+        if all_ints:
+            values = np.array(values, dtype=np.uint64)
+        else:
+            values = np.array(values + [None], dtype=object)[:-1]
+        order = np.argsort(addresses)
+        return addresses[order], values[order]
+
+    def load_state(self, transactions):
+        """
+        Load the accounts, assets, apps and boxes the transactions can access from the state provider.
+        State that is already in the ledger is not replaced. Called before every eval.
+        """
+        if self.state_provider is None:
+            return
+        addresses, apps, assets, boxes = get_footprint(transactions)
+        for app_id in apps:
+            self._provide_app(app_id)
+        for asset_id in assets:
+            self._provide_asset(asset_id)
+            if asset_id in self.assets:
+                # the asset params are written with the creator's account
+                self._provide_account(self.assets[asset_id]['creator'])
+        for address in addresses:
+            self._provide_account(address)
+        for app_id, key in boxes:
+            self._provide_box(app_id, key)
+
+    def _provide(self, key):
+        """Returns True the first time a state key is requested."""
+        if key in self.provided:
+            return False
+        self.provided.add(key)
+        return True
+
+    def _provide_account(self, address):
+        if not self._provide(('account', address)) or address in self.accounts:
+            return
+        account = self.state_provider.get_account(address)
+        if account is None:
+            return
+        self.accounts[address] = {'address': address, **account}
+        for asset_id in account['balances']:
+            if asset_id:
+                self._provide_asset(asset_id)
+        for app_id in account['local_states']:
+            self._provide_app(app_id)
+        self._account_changed(address)
+
+    def _provide_asset(self, asset_id):
+        if not self._provide(('asset', asset_id)) or asset_id in self.assets:
+            return
+        params = self.state_provider.get_asset(asset_id)
+        if params is not None:
+            self.assets[asset_id] = params
+            self._hash_asset(asset_id)
+
+    def _provide_app(self, app_id):
+        if not self._provide(('app', app_id)) or app_id in self.apps:
+            return
+        result = self.state_provider.get_app(app_id)
+        if result is None:
+            return
+        app, global_state = result
+        self.apps[app_id] = app
+        self._hash_app(app_id)
+        self.global_states[app_id] = global_state
+        self._hash_global_state(app_id)
+        self.unloaded_box_stats[app_id] = list(self.state_provider.get_box_stats(app_id))
+        # the app params are written with the creator's account
+        self._provide_account(app['creator'])
+
+    def _provide_box(self, app_id, key):
+        if not self._provide(('box', app_id, key)) or self.box_exists(app_id, key):
+            return
+        value = self.state_provider.get_box(app_id, key)
+        if value is None:
+            return
+        self.set_box(app_id, key, value)
+        stats = self.unloaded_box_stats.get(app_id)
+        if stats:
+            stats[0] -= 1
+            stats[1] -= len(key) + len(value)
+
     def eval_transactions(self, transactions, block_timestamp=None):
-        self.init_ledger_db(block_timestamp or self.next_timestamp)
-        self.write()
-        self.write_transactions(transactions)
+        """
+        Evaluate a list of signed transactions (algosdk objects or msgpack encoded bytes) in a single block
+        and apply the resulting state changes.
+        """
+        self.load_state(transactions)
+        if self.eval_cache is not None:
+            cache_key = self._get_eval_cache_key(transactions, block_timestamp)
+            result = self.eval_cache.get(cache_key)
+            if result is None:
+                result = self._eval(transactions, block_timestamp)
+                self.eval_cache.set(cache_key, result)
+        else:
+            result = self._eval(transactions, block_timestamp)
+        self._apply(result)
+        return result['block']
+
+    def eval_transaction_groups(self, groups, block_timestamp=None, max_block_bytes=MAX_TXN_BYTES_PER_BLOCK):
+        """
+        Evaluate an iterable of transaction groups of any length.
+        Groups are packed into blocks of at most `max_block_bytes` of encoded transactions
+        and `(groups, block)` is yielded as each block is evaluated. Only one block of groups is held at a time.
+        The evaluator's limit also counts the apply data of the transactions, e.g. logs and inner transactions,
+        so a block that runs out of space is split in two and evaluated again.
+        """
+        block_groups = []
+        block_encoded = []
+        block_bytes = 0
+        for group in groups:
+            encoded = [encode_transaction(stxn) for stxn in group]
+            group_bytes = sum(len(e) for e in encoded)
+            if block_groups and block_bytes + group_bytes > max_block_bytes:
+                yield from self._eval_block_groups(block_groups, block_encoded, block_timestamp)
+                block_groups, block_encoded, block_bytes = [], [], 0
+            block_groups.append(group)
+            block_encoded.append(encoded)
+            block_bytes += group_bytes
+        if block_groups:
+            yield from self._eval_block_groups(block_groups, block_encoded, block_timestamp)
+
+    def _eval_block_groups(self, groups, encoded_groups, block_timestamp):
         try:
-            result = gojig.eval()
-        except Exception as e:
-            result = e.args[0]
-            if 'logic eval error' in result:
-                txn_id = re.findall('transaction ([0-9A-Z]+):', result)[0]
-                app_id = None
-                for stxn in transactions:
-                    if stxn.get_txid() == txn_id:
-                        app_id = stxn.transaction.index
-                        break
-                error = re.findall('error: (.+?) pc=', result)[-1]
-                pc = int(re.findall(r'pc=(\d+)', result)[-1])
-                line = None
-                if app_id:
-                    p = self.apps[app_id]['approval_program']
-                    line = p.lookup(pc)
-                if 'logic eval error: logic eval error:' in result:
-                    print(result)
-                raise LogicEvalError(result, txn_id, error, line) from None
-            elif 'rejected by logic' in result:
-                txn_id = re.findall('transaction ([0-9A-Z]+):', result)[0]
-                # lsig = None
-                # for stxn in transactions:
-                #     if stxn.get_txid() == txn_id:
-                #         lsig = stxn.lsig
-                #         break
-                if 'err=' in result and 'pc=' in result:
-                    error = re.findall('err=(.+?) pc=', result)[0]
-                    pc = int(re.findall(r'pc=(\d+)', result)[0])
-                else:
-                    error = 'reject'
-                    pc = None
-                line = None
-                raise LogicSigReject(result, txn_id, error, line) from None
-            elif 'transaction rejected by ApprovalProgram' in result:
-                raise AppCallReject(result)
-            else:
+            block = self.eval_transactions([e for encoded in encoded_groups for e in encoded], block_timestamp)
+        except EvalError as e:
+            if NO_SPACE_ERROR not in str(e) or len(groups) == 1:
                 raise
-        for a in list(result['accounts'].keys()):
-            result['accounts'][encode_address(a)] = result['accounts'].pop(a)
+            block = None
+        if block is not None:
+            yield groups, block
+            return
+        half = len(groups) // 2
+        yield from self._eval_block_groups(groups[:half], encoded_groups[:half], block_timestamp)
+        yield from self._eval_block_groups(groups[half:], encoded_groups[half:], block_timestamp)
+
+    def eval_independent_groups(self, groups, block_timestamp=None):
+        """
+        Evaluate transaction groups in a single block, rejecting failing groups instead of failing the whole eval.
+        The passing groups are applied. Each group must be a single transaction or transactions with a group id.
+        Returns (block, statuses) with None for applied groups and the error for rejected groups.
+        """
+        groups = [list(group) for group in groups]
+        transactions = [stxn for group in groups for stxn in group]
+        if get_group_sizes(transactions) != [len(group) for group in groups]:
+            raise ValueError('groups do not match the transaction group ids')
+        self.load_state(transactions)
+        self._prepare(block_timestamp)
+        result = self._run(transactions, continue_on_error=True)
+        statuses = []
+        for group, status in zip(groups, result['statuses']):
+            if not status:
+                statuses.append(None)
+                continue
+            message = f"{status[b'stage'].decode()}: {status[b'error'].decode()}"
+            statuses.append(self._parse_eval_error(message, group) or Exception(message))
+        self._apply(result)
+        return result['block'], statuses
+
+    def simulate_transactions(self, transactions, block_timestamp=None):
+        """
+        Evaluate transactions without applying the result to the ledger.
+        Returns a dict with the block, the raw accounts and boxes it changed and the StateDelta.
+        """
+        self.load_state(transactions)
+        result = self._eval(transactions, block_timestamp)
+        result['delta'] = compute_state_delta(self, result['block'], result['accounts'], result['boxes'])
+        return result
+
+    def simulate_alternatives(self, alternatives, block_timestamp=None):
+        """
+        Evaluate each list of transactions in `alternatives` against the current state without applying any of them.
+        The ledger db is prepared once and restored from a copy before each alternative.
+        Returns a list with the simulate_transactions result, or the eval error, for each alternative.
+        Other errors, e.g. a missing evaluator binary, are raised.
+        """
+        results = []
+        alternatives = list(alternatives)
+        for transactions in alternatives:
+            self.load_state(transactions)
+        base_dir = tempfile.mkdtemp(prefix='jig_base_')
+        try:
+            self._prepare(block_timestamp)
+            gojig.save_ledger(base_dir)
+            for i, transactions in enumerate(alternatives):
+                if i > 0:
+                    gojig.restore_ledger(base_dir)
+                try:
+                    result = self._run(transactions)
+                except (EvalError, LogicEvalError, LogicSigReject, AppCallReject) as e:
+                    results.append(e)
+                    continue
+                result['delta'] = compute_state_delta(self, result['block'], result['accounts'], result['boxes'])
+                results.append(result)
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+        return results
+
+    def _apply(self, result):
+        self.last_delta = compute_state_delta(self, result['block'], result['accounts'], result['boxes'])
         self.update_accounts(result['accounts'])
         self.update_boxes(result['boxes'])
         self.last_block = result['block']
-        return result['block']
-
-    def write_transactions(self, transactions):
-        write_to_file(transactions, self.stxn_filename)
+        if self.history is not None:
+            self.history.add_block(result['block'])
+
+    def _get_state_digest(self):
+        """
+        A full hash of the ledger contents for the eval cache key. Unlike state_hash() it is computed from the
+        current state, so changes made to objects returned by the getters can't produce a stale cache hit.
+        """
+        h = hashlib.sha256()
+
+        def update(*values):
+            h.update(msgpack.packb(values, use_bin_type=True))
+
+        for address in sorted(self.accounts):
+            a = self.accounts[address]
+            update(
+                address,
+                sorted(a['balances'].items()),
+                sorted((app_id, sorted(state.items())) for app_id, state in a['local_states'].items()),
+                a.get('auth_addr'),
+            )
+        for app_id in sorted(self.apps):
+            a = self.apps[app_id]
+            update(
+                app_id, a['creator'], a['approval_program_bytecode'],
+                a['local_ints'], a['local_bytes'], a['global_ints'], a['global_bytes'], a.get('extra_pages', 0),
+            )
+        for app_id in sorted(self.global_states):
+            update(app_id, sorted(self.global_states[app_id].items()))
+        for asset_id in sorted(self.assets):
+            update(asset_id, sorted(self.assets[asset_id].items()))
+        for app_id, key, value in sorted(self.boxes.iter_boxes()):
+            update(app_id, key, bytes(value))
+        return h.hexdigest()
+
+    def _get_eval_cache_key(self, transactions, block_timestamp):
+        h = hashlib.sha256()
+        h.update(self._get_state_digest().encode())
+        for stxn in transactions:
+            h.update(encode_transaction(stxn))
+        h.update(msgpack.packb([
+            block_timestamp or self.next_timestamp,
+            self.verify_signatures,
+            gojig.binary_version(),
+        ]))
+        return h.hexdigest()
+
+    def _eval(self, transactions, block_timestamp=None):
+        self._prepare(block_timestamp)
+        return self._run(transactions)
+
+    def _prepare(self, block_timestamp=None):
+        self.block_timestamp = block_timestamp or self.next_timestamp
+        self.init_ledger_db()
+        self.write()
 
-    def init_ledger_db(self, block_timestamp):
-        return gojig.init_ledger(block_timestamp)
+    def _run(self, transactions, continue_on_error=False):
+        stxns = b''.join(encode_transaction(stxn) for stxn in transactions)
+        try:
+            result = gojig.eval(stxns, skip_verify=not self.verify_signatures, continue_on_error=continue_on_error)
+        except Exception as e:
+            error = self._parse_eval_error(e.args[0], transactions)
+            if error is None:
+                raise
+            raise error from None
+        for a in list(result['accounts'].keys()):
+            result['accounts'][encode_address(a)] = result['accounts'].pop(a)
+        return result
+
+    def _parse_eval_error(self, result, transactions):
+        if 'logic eval error' in result:
+            txn_id = re.findall('transaction ([0-9A-Z]+):', result)[0]
+            app_id = None
+            for stxn in transactions:
+                if get_txid(stxn) == txn_id:
+                    app_id = get_app_id(stxn)
+                    break
+            error = re.findall('error: (.+?) pc=', result)[-1]
+            pc = int(re.findall(r'pc=(\d+)', result)[-1])
+            line = None
+            # apps created by evals or loaded from a state provider have no program object
+            p = self.apps.get(app_id, {}).get('approval_program') if app_id else None
+            if p is not None:
+                line = p.lookup(pc)
+            if 'logic eval error: logic eval error:' in result:
+                print(result)
+            return LogicEvalError(result, txn_id, error, line)
+        elif 'rejected by logic' in result:
+            txn_id = re.findall('transaction ([0-9A-Z]+):', result)[0]
+            # lsig = None
+            # for stxn in transactions:
+            #     if stxn.get_txid() == txn_id:
+            #         lsig = stxn.lsig
+            #         break
+            if 'err=' in result and 'pc=' in result:
+                error = re.findall('err=(.+?) pc=', result)[0]
+                pc = int(re.findall(r'pc=(\d+)', result)[0])
+            else:
+                error = 'reject'
+                pc = None
+            line = None
+            return LogicSigReject(result, txn_id, error, line)
+        elif 'transaction rejected by ApprovalProgram' in result:
+            return AppCallReject(result)
+        return None
+
+    def init_ledger_db(self):
+        # The genesis ledger is the same for every eval. It is copied from a cached template
+        # and the block timestamp is set in write_block.
+        return gojig.init_ledger_from_template()
 
     def open_db(self):
         self.db = sqlite3.connect(self.filename)
@@ -252,25 +779,27 @@ class JigLedger:
             self.db.execute(q, [app_id, decode_address(a['creator']), 1])
 
     def write_accounts(self):
+        app_addresses = {get_application_address(app_id): app_id for app_id in self.apps}
+        created_apps = Counter(app['creator'] for app in self.apps.values())
         for address, a in self.accounts.items():
             algo = a['balances'][0][0]
-            for app_id in self.apps:
-                if get_application_address(app_id) == address:
-                    break
-            else:
-                app_id = None
+            app_id = app_addresses.get(address)
             data = {
                 'b': algo,
                 'e': decode_address(a.get('auth_addr')),
                 'j': len(a['balances']) - 1,
                 'l': len(a['local_states']),
-                'k': sum(1 for a in self.apps.values() if a['creator'] == address),
+                'k': created_apps[address],
             }
             # Box related data only applies to application accounts
             if app_id is not None:
-                if self.boxes.get(app_id):
-                    data['m'] = len(self.boxes[app_id])  # TotalBoxes
-                    data['n'] = sum(len(k) + len(v or "") for k, v in self.boxes[app_id].items())  # TotalBoxBytes
+                box_count, box_bytes = self.boxes.get_box_stats(app_id)
+                unloaded_count, unloaded_bytes = self.unloaded_box_stats.get(app_id, (0, 0))
+                box_count += unloaded_count
+                box_bytes += unloaded_bytes
+                if box_count:
+                    data['m'] = box_count  # TotalBoxes
+                    data['n'] = box_bytes  # TotalBoxBytes
 
             q = 'INSERT INTO accountbase (address, data) VALUES (?, ?)'
             a['rowid'] = self.db.execute(q, [decode_address(address), msgpack.packb(data)]).lastrowid
@@ -326,35 +855,40 @@ class JigLedger:
         self.db.execute(q, [0, 0])
 
     def write_boxes(self):
-        q = 'INSERT INTO kvstore (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value'
-        for app_id, boxes in self.boxes.items():
-            for key, value in boxes.items():
-                box_key = (b'bx:' + app_id.to_bytes(8, 'big') + key)
-                self.db.execute(q, [box_key, value or ""])
+        self.boxes.write_kvstore(self.db)
 
     def write_block(self):
         max_id = max(list(self.assets.keys()) + list(self.apps.keys()) + [-1])
+        if self.state_provider is not None:
+            max_id = max(max_id, self.state_provider.get_max_creatable_id())
         q = "SELECT hdrdata from blocks where rnd = 1"
         hdr_b = self.block_db.execute(q).fetchone()[0]
         hdr = msgpack.unpackb(hdr_b, strict_map_key=False)
         # Set 'tc' (Transaction Counter) which defines where asset/app_ids start
         # Set it to 1 greater than the current max id used for assets/apps
         hdr['tc'] = max_id + 1
+        hdr['ts'] = self.block_timestamp
         q = "UPDATE blocks set hdrdata = ? where rnd = 1"
         self.block_db.execute(q, [msgpack.packb(hdr)])
-
-    def update_boxes(self, updated_boxes):
-        updated_keys = set()
-        for k, v in updated_boxes.items():
-            app_id = int.from_bytes(k[3:11], "big")
-            key = k[11:]
-            updated_keys.add((app_id, key))
-            self.set_box(app_id, key, v)
-        # Remove deleted boxes:
-        for app_id in self.boxes:
-            for key in list(self.boxes[app_id].keys()):
-                if (app_id, key) not in updated_keys:
-                    self.boxes[app_id].pop(key)
+        # The tracker db keeps a copy of the header in txtail ('h' of the round data). It is used by
+        # BlockHdrCached, e.g. for `txn FirstValidTime` and `block BlkTimestamp`.
+        q = "SELECT data from txtail where rnd = 1"
+        row = self.db.execute(q).fetchone()
+        if row is not None:
+            data = msgpack.unpackb(row[0], strict_map_key=False)
+            data['h'] = hdr
+            q = "UPDATE txtail set data = ? where rnd = 1"
+            self.db.execute(q, [msgpack.packb(data)])
+
+    def update_boxes(self, box_mods):
+        # Only boxes modified by the block are returned. Deleted boxes have a None value.
+        for kv_key, value in box_mods.items():
+            app_id, key = split_box_kv_key(kv_key)
+            if value is None:
+                if self.box_exists(app_id, key):
+                    self.delete_box(app_id, key)
+            else:
+                self.set_box(app_id, key, value)
 
     def update_accounts(self, updated_accounts):
         old_assets = dict(self.assets)
@@ -375,6 +909,7 @@ class JigLedger:
                     'metadata_hash': params.get(b'am', None),
                     'creator': a,
                 }
+                self._hash_asset(aid)
                 # ensure creator has an asset holding record even if it is a 0 amount
                 if b'asset' not in updated_accounts[a]:
                     updated_accounts[a][b'asset'] = {}
@@ -383,6 +918,7 @@ class JigLedger:
             if a not in self.accounts:
                 self.set_account_balance(a, 0)
             account = self.accounts[a]
+            old_account = {k: account.get(k) for k in ('balances', 'local_states', 'auth_addr')}
             # reset all account balances
             account['balances'] = {}
             account['balances'][0] = [updated_accounts[a].get(b'algo', 0), False]
@@ -395,10 +931,7 @@ class JigLedger:
             # opted in apps
             account['local_states'] = {}
             for aid, data in updated_accounts[a].get(b'appl', {}).items():
-                state = {}
-                for k, v in data.get(b'tkv', {}).items():
-                    state[k] = v.get(b'tb') if v[b'tt'] == 1 else v.get(b'ui', 0)
-                account['local_states'][aid] = state
+                account['local_states'][aid] = decode_state(data.get(b'tkv', {}))
 
             # created apps
             for aid, data in updated_accounts[a].get(b'appp', {}).items():
@@ -415,10 +948,11 @@ class JigLedger:
                         'global_ints': global_schema.get(b'nui', 0),
                         'global_bytes': global_schema.get(b'nbs', 0),
                     }
-                state = {}
-                for k, v in data.get(b'gs', {}).items():
-                    state[k] = v.get(b'tb') if v[b'tt'] == 1 else v.get(b'ui', 0)
-                self.global_states[aid] = state
+                    self._hash_app(aid)
+                self.global_states[aid] = decode_state(data.get(b'gs', {}))
+                self._hash_global_state(aid)
+
+            self._account_changed(a, old_account)
 
             # TODO: We don't handle changes to the app's programs here.
             # We should be updating self.apps too but that's a bit tricky because it contains references
@@ -0,0 +1,212 @@
+import os
+import pickle
+import time
+from collections import namedtuple
+from dataclasses import dataclass, field
+from typing import List
+
+from algosdk.encoding import msgpack
+
+from .exceptions import ReplayError
+from .ledger import MAX_TXN_BYTES_PER_BLOCK, encode_transaction
+
+# JigLedger attributes saved in checkpoints. Boxes are saved separately through the box store.
+CHECKPOINT_ATTRS = [
+    'accounts', 'apps', 'assets', 'global_states', 'raw_accounts', 'state_hasher', 'creator', 'creator_sk',
+    'indexes', 'next_timestamp', 'provided', 'unloaded_box_stats',
+]
+
+# A block of recorded groups. `position` and `end_position` are group indexes in the recording
+# and `end_offset` is the file offset of the next group.
+ReplayBlock = namedtuple('ReplayBlock', ['position', 'end_position', 'end_offset', 'timestamp', 'txns', 'groups'])
+
+
+@dataclass
+class BlockTiming:
+    position: int
+    timestamp: int
+    groups: int
+    transactions: int
+    seconds: float
+
+
+@dataclass
+class ReplayStats:
+    blocks: List[BlockTiming] = field(default_factory=list)
+
+    @property
+    def transactions(self):
+        return sum(b.transactions for b in self.blocks)
+
+    @property
+    def seconds(self):
+        return sum(b.seconds for b in self.blocks)
+
+    @property
+    def transactions_per_second(self):
+        return self.transactions / self.seconds if self.seconds else 0.0
+
+
+def write_recording(filename, records):
+    """
+    Write (timestamp, group) records to a recording file: a msgpack stream of {'ts': ..., 'txns': [...]} maps
+    with the canonical msgpack encoding of each signed transaction.
+    """
+    with open(filename, 'wb') as f:
+        for timestamp, group in records:
+            txns = [encode_transaction(stxn) for stxn in group]
+            f.write(msgpack.packb({'ts': timestamp, 'txns': txns}, use_bin_type=True))
+
+
+class Replay:
+    """
+    Replays a recording of transaction groups against a JigLedger.
+
+    Consecutive groups with the same timestamp are evaluated in one block, up to `max_block_bytes` of transactions.
+    The same JigLedger is used for every block, but each block is evaluated like JigLedger.eval_transactions:
+    the go-algorand ledger is copied from the genesis template and the whole ledger state is written to it, so a
+    block still costs O(total state). The go-algorand ledger is not kept between blocks because it only commits
+    account changes to its tracker database some rounds after the block, while evals and checkpoints start
+    from the JigLedger state.
+    Every `checkpoint_interval` blocks the ledger state is saved to `checkpoint_dir` so a replay can be resumed
+    (`run(resume=True)`) or bisected from the middle. Restoring a checkpoint also removes the blocks added to
+    the ledger's HistoryStore after it.
+    """
+
+    def __init__(self, ledger, filename, checkpoint_dir=None, checkpoint_interval=100,
+                 max_block_bytes=MAX_TXN_BYTES_PER_BLOCK):
+        self.ledger = ledger
+        self.filename = filename
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.max_block_bytes = max_block_bytes
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def iter_blocks(self, position=0, offset=0):
+        """Yield a ReplayBlock for each block of the recording, starting from a group position and file offset."""
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            unpacker = msgpack.Unpacker(f, raw=False)
+            block_position = position
+            block_txns = []
+            block_bytes = 0
+            timestamp = None
+            record_offset = offset
+            for record in unpacker:
+                group_bytes = sum(len(t) for t in record['txns'])
+                new_block = record['ts'] != timestamp or block_bytes + group_bytes > self.max_block_bytes
+                if block_txns and new_block:
+                    yield ReplayBlock(block_position, position, record_offset, timestamp, block_txns,
+                                      position - block_position)
+                    block_position, block_txns, block_bytes = position, [], 0
+                timestamp = record['ts']
+                block_txns.extend(record['txns'])
+                block_bytes += group_bytes
+                position += 1
+                # offset of the next record
+                record_offset = offset + unpacker.tell()
+            if block_txns:
+                yield ReplayBlock(block_position, position, record_offset, timestamp, block_txns,
+                                  position - block_position)
+
+    def run(self, resume=False, stop=None, on_block=None):
+        """
+        Replay the recording, or the rest of it from the latest checkpoint if `resume` is True.
+        Stops before the block containing group `stop` if given. `on_block(block, ledger)` is called after each block.
+        Returns ReplayStats. Raises ReplayError if a block fails.
+        """
+        position, offset = 0, 0
+        if resume and self.list_checkpoints():
+            position, offset = self.restore_checkpoint(*self.list_checkpoints()[-1])
+        elif self.checkpoint_dir:
+            # checkpoints of a previous run are replaced
+            for checkpoint in self.list_checkpoints():
+                os.remove(self._checkpoint_filename(*checkpoint))
+            self.save_checkpoint(0, 0)
+        stats = ReplayStats()
+        for i, block in enumerate(self.iter_blocks(position, offset), start=1):
+            if stop is not None and block.end_position > stop:
+                break
+            self._eval_block(block, stats)
+            if on_block is not None:
+                on_block(block, self.ledger)
+            if self.checkpoint_dir and i % self.checkpoint_interval == 0:
+                self.save_checkpoint(block.end_position, block.end_offset)
+        return stats
+
+    def _eval_block(self, block, stats):
+        start = time.perf_counter()
+        try:
+            self.ledger.eval_transactions(block.txns, block_timestamp=block.timestamp)
+        except Exception as e:
+            raise ReplayError(block.position, block.timestamp, e) from e
+        seconds = time.perf_counter() - start
+        stats.blocks.append(BlockTiming(block.position, block.timestamp, block.groups, len(block.txns), seconds))
+
+    def bisect(self, predicate):
+        """
+        Find the first block after which `predicate(ledger)` is True, assuming it stays True once it is.
+        The checkpoints of a previous run are searched first and only the blocks after the last checkpoint
+        where the predicate is False are replayed. Returns the ReplayBlock or None.
+        """
+        checkpoints = self.list_checkpoints()
+        assert checkpoints, 'bisect requires the checkpoints of a previous run'
+        self.restore_checkpoint(*checkpoints[0])
+        if predicate(self.ledger):
+            return None
+        lo, hi = 0, len(checkpoints)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            self.restore_checkpoint(*checkpoints[mid])
+            if predicate(self.ledger):
+                hi = mid
+            else:
+                lo = mid
+        position, offset = self.restore_checkpoint(*checkpoints[lo])
+        stats = ReplayStats()
+        for block in self.iter_blocks(position, offset):
+            self._eval_block(block, stats)
+            if predicate(self.ledger):
+                return block
+        return None
+
+    def _checkpoint_filename(self, position, offset):
+        return os.path.join(self.checkpoint_dir, f'{position:012d}-{offset}.pickle')
+
+    def list_checkpoints(self):
+        """Returns the (position, offset) of the saved checkpoints in order."""
+        if not self.checkpoint_dir:
+            return []
+        checkpoints = []
+        for name in os.listdir(self.checkpoint_dir):
+            if name.endswith('.pickle'):
+                position, offset = name[:-len('.pickle')].split('-')
+                checkpoints.append((int(position), int(offset)))
+        return sorted(checkpoints)
+
+    def save_checkpoint(self, position, offset):
+        state = {name: getattr(self.ledger, name) for name in CHECKPOINT_ATTRS}
+        state['boxes'] = [(app_id, key, bytes(value)) for app_id, key, value in self.ledger.boxes.iter_boxes()]
+        if self.ledger.history is not None:
+            state['history_blocks'] = len(self.ledger.history)
+        filename = self._checkpoint_filename(position, offset)
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + '.tmp', filename)
+
+    def restore_checkpoint(self, position, offset):
+        """Restore the ledger state saved at `position`. Returns (position, offset) to continue from."""
+        with open(self._checkpoint_filename(position, offset), 'rb') as f:
+            state = pickle.load(f)
+        boxes = self.ledger.boxes
+        for app_id, key, _ in list(boxes.iter_boxes()):
+            boxes.delete_box(app_id, key)
+        for app_id, key, value in state.pop('boxes'):
+            boxes.set_box(app_id, key, value)
+        history_blocks = state.pop('history_blocks', None)
+        if self.ledger.history is not None and history_blocks is not None:
+            self.ledger.history.truncate(history_blocks)
+        for name, value in state.items():
+            setattr(self.ledger, name, value)
+        return position, offset
@@ -0,0 +1,113 @@
+from algosdk.encoding import msgpack
+
+from .boxes import SqliteBoxStore
+
+
+class StateProvider:
+    """
+    A source of ledger state that a JigLedger loads on demand. See JigLedger.load_state.
+
+    State is returned in the ledger's own representation, or None if it does not exist.
+    Subclass it to load state from a callback, e.g. an indexer or a node.
+    """
+
+    def get_account(self, address):
+        """Returns {'balances': {asset_id: [amount, frozen]}, 'local_states': {app_id: state}, 'auth_addr': ...}"""
+        raise NotImplementedError()
+
+    def get_asset(self, asset_id):
+        """Returns the asset params, as passed to JigLedger.create_asset. They include the creator."""
+        raise NotImplementedError()
+
+    def get_app(self, app_id):
+        """Returns (app, global state). `app` is like a JigLedger.apps value, with the approval program bytecode."""
+        raise NotImplementedError()
+
+    def get_box(self, app_id, key):
+        raise NotImplementedError()
+
+    def get_box_stats(self, app_id):
+        """Returns (count, total bytes of keys and values) of all the app's boxes."""
+        raise NotImplementedError()
+
+    def get_max_creatable_id(self):
+        """The largest asset or app id, so ids created by evals don't collide with state that isn't loaded."""
+        raise NotImplementedError()
+
+
+def pack(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False, use_list=True)
+
+
+class SnapshotStateProvider(StateProvider):
+    """
+    A StateProvider reading an indexed sqlite snapshot file written by save_snapshot.
+    Boxes are stored like a SqliteBoxStore so box stats are known without reading the boxes.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.box_store = SqliteBoxStore(filename)
+        self.db = self.box_store.db
+        self.db.execute('CREATE TABLE IF NOT EXISTS accounts (address TEXT PRIMARY KEY, data BLOB)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS assets (asset_id INTEGER PRIMARY KEY, data BLOB)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS apps (app_id INTEGER PRIMARY KEY, data BLOB)')
+
+    def _get(self, table, column, value):
+        row = self.db.execute(f'SELECT data FROM {table} WHERE {column} = ?', [value]).fetchone()
+        return None if row is None else unpack(row[0])
+
+    def get_account(self, address):
+        return self._get('accounts', 'address', address)
+
+    def get_asset(self, asset_id):
+        return self._get('assets', 'asset_id', asset_id)
+
+    def get_app(self, app_id):
+        data = self._get('apps', 'app_id', app_id)
+        return None if data is None else (data['app'], data['global_state'])
+
+    def get_box(self, app_id, key):
+        if not self.box_store.box_exists(app_id, key):
+            return None
+        return bytes(self.box_store.get_box(app_id, key))
+
+    def get_box_stats(self, app_id):
+        return self.box_store.get_box_stats(app_id)
+
+    def get_max_creatable_id(self):
+        q = 'SELECT max(id) FROM (SELECT max(asset_id) AS id FROM assets UNION ALL SELECT max(app_id) FROM apps)'
+        return self.db.execute(q).fetchone()[0] or 0
+
+    def close(self):
+        self.box_store.close()
+
+
+def save_snapshot(ledger, filename):
+    """Write the state of a JigLedger to a snapshot file for SnapshotStateProvider."""
+    provider = SnapshotStateProvider(filename)
+    db = provider.db
+    q = 'INSERT OR REPLACE INTO accounts (address, data) VALUES (?, ?)'
+    db.executemany(q, (
+        (address, pack({k: a[k] for k in ('balances', 'local_states', 'auth_addr') if k in a}))
+        for address, a in ledger.accounts.items()
+    ))
+    q = 'INSERT OR REPLACE INTO assets (asset_id, data) VALUES (?, ?)'
+    db.executemany(q, ((asset_id, pack(params)) for asset_id, params in ledger.assets.items()))
+    q = 'INSERT OR REPLACE INTO apps (app_id, data) VALUES (?, ?)'
+    db.executemany(q, (
+        (app_id, pack({
+            # Program objects are not stored. Errors of loaded apps are reported without source lines.
+            'app': {k: v for k, v in app.items() if k != 'approval_program'},
+            'global_state': ledger.global_states.get(app_id, {}),
+        }))
+        for app_id, app in ledger.apps.items()
+    ))
+    for app_id, key, value in ledger.boxes.iter_boxes():
+        provider.box_store.set_box(app_id, key, value)
+    db.commit()
+    provider.close()
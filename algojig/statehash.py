@@ -0,0 +1,45 @@
+import hashlib
+
+from algosdk.encoding import msgpack
+
+MODULUS = 2 ** 256
+
+
+def hash_item(key, value):
+    data = msgpack.packb([key, value], use_bin_type=True)
+    return int.from_bytes(hashlib.sha256(data).digest(), 'big')
+
+
+class StateHash:
+    """
+    An incrementally updated hash of a set of (key, value) items.
+
+    Each item is hashed separately and the item hashes are summed modulo 2**256, so the result does not
+    depend on the order of updates and an item can be replaced or removed without rehashing the others.
+    The hashes of items added with `set` are kept so they can be replaced. Items added with `add` are not
+    kept; the caller must `discard` the old value before adding a new one. That is used for boxes so the
+    hash does not hold a Python object per box.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.item_hashes = {}
+
+    def set(self, key, value):
+        item_hash = hash_item(key, value)
+        old_item_hash = self.item_hashes.get(key, 0)
+        self.value = (self.value - old_item_hash + item_hash) % MODULUS
+        self.item_hashes[key] = item_hash
+
+    def remove(self, key):
+        old_item_hash = self.item_hashes.pop(key, 0)
+        self.value = (self.value - old_item_hash) % MODULUS
+
+    def add(self, key, value):
+        self.value = (self.value + hash_item(key, value)) % MODULUS
+
+    def discard(self, key, value):
+        self.value = (self.value - hash_item(key, value)) % MODULUS
+
+    def hexdigest(self):
+        return self.value.to_bytes(32, 'big').hex()
@@ -0,0 +1,100 @@
+import base64
+
+from algosdk.encoding import checksum, msgpack
+from nacl.signing import SigningKey
+
+from .addresses import decode_address
+
+# msgpack transaction fields that hold addresses. Patched values may be given as address strings.
+ADDRESS_FIELDS = {'snd', 'rcv', 'close', 'arcv', 'asnd', 'aclose', 'fadd', 'rekey'}
+ADDRESS_LIST_FIELDS = {'apat'}
+
+
+def canonical(d):
+    """Sort a msgpack dict recursively and remove zero values, as algosdk.encoding.msgpack_encode does."""
+    result = {}
+    for k, v in sorted(d.items()):
+        if isinstance(v, dict):
+            v = canonical(v)
+        if v:
+            result[k] = v
+    return result
+
+
+def get_group_id(txids):
+    """The group id of transactions with the given raw (32 byte) transaction ids."""
+    return checksum(b'TG' + msgpack.packb({'txlist': txids}, use_bin_type=True))
+
+
+class TransactionTemplate:
+    """
+    A transaction group encoded once so variants can be produced by patching msgpack fields.
+
+    `transactions` are algosdk Transactions. `secrets` has a private key for each transaction, or None to
+    produce unsigned transactions (for ledgers with verify_signatures = False). If there is more than one
+    transaction the group id is recomputed for every variant.
+
+    Patches are dicts of msgpack field names to values, e.g. {'amt': 5, 'rcv': address, 'apaa': [b'x']},
+    one per transaction. Missing trailing patches leave their transactions unchanged. Variants are lists of canonical msgpack encoded signed transactions, which can be
+    passed directly to JigLedger.eval_transactions.
+    """
+
+    def __init__(self, transactions, secrets=None):
+        self.txns = [canonical(txn.dictify()) for txn in transactions]
+        for txn in self.txns:
+            txn.pop('grp', None)
+        self.grouped = len(self.txns) > 1
+        if secrets is not None and len(secrets) != len(self.txns):
+            raise ValueError(f'{len(secrets)} secrets given for {len(self.txns)} transactions')
+        # (signing key, public key) of each transaction or None
+        self.keys = []
+        for secret in secrets or [None] * len(self.txns):
+            if secret is None:
+                self.keys.append(None)
+                continue
+            key = base64.b64decode(secret)
+            self.keys.append((SigningKey(key[:32]), key[32:]))
+
+    def render(self, *patches):
+        """Returns the encoded signed transactions with the patches applied."""
+        if len(patches) > len(self.txns):
+            raise ValueError(f'{len(patches)} patches given for {len(self.txns)} transactions')
+        patches = patches + (None,) * (len(self.txns) - len(patches))
+        txns = []
+        for txn, patch in zip(self.txns, patches):
+            if patch:
+                txn = dict(txn)
+                for k, v in patch.items():
+                    if k in ADDRESS_FIELDS and type(v) == str:
+                        v = decode_address(v)
+                    elif k in ADDRESS_LIST_FIELDS:
+                        v = [decode_address(a) if type(a) == str else a for a in v]
+                    txn[k] = v
+                txn = canonical(txn)
+            txns.append(txn)
+
+        if self.grouped:
+            txids = [checksum(b'TX' + msgpack.packb(txn, use_bin_type=True)) for txn in txns]
+            group_id = get_group_id(txids)
+            txns = [canonical({**txn, 'grp': group_id}) for txn in txns]
+
+        stxns = []
+        for txn, key in zip(txns, self.keys):
+            if key is None:
+                stxn = {'txn': txn}
+            else:
+                signing_key, public_key = key
+                stxn = {}
+                # the signer is set for rekeyed senders
+                if public_key != txn['snd']:
+                    stxn['sgnr'] = public_key
+                stxn['sig'] = signing_key.sign(b'TX' + msgpack.packb(txn, use_bin_type=True)).signature
+                stxn['txn'] = txn
+            stxns.append(msgpack.packb(stxn, use_bin_type=True))
+        return stxns
+
+    def render_many(self, variants):
+        """Yield the encoded transactions for each tuple of patches in `variants`."""
+        render = self.render
+        for patches in variants:
+            yield render(*patches)
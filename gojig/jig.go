@@ -0,0 +1,366 @@
+package main
+
+import (
+	"encoding/base64"
+	"encoding/json"
+	"fmt"
+	"io"
+	"os"
+	"runtime"
+	"sync"
+
+	"github.com/algorand/go-algorand/agreement"
+	"github.com/algorand/go-algorand/config"
+	"github.com/algorand/go-algorand/crypto"
+	"github.com/algorand/go-algorand/data/basics"
+	"github.com/algorand/go-algorand/data/bookkeeping"
+	"github.com/algorand/go-algorand/data/transactions"
+	"github.com/algorand/go-algorand/data/transactions/logic"
+	"github.com/algorand/go-algorand/data/transactions/verify"
+	"github.com/algorand/go-algorand/ledger"
+	"github.com/algorand/go-algorand/ledger/ledgercore"
+	"github.com/algorand/go-algorand/logging"
+	"github.com/algorand/go-algorand/protocol"
+	"github.com/algorand/go-codec/codec"
+)
+
+// The core evaluator functions return their output or an error instead of writing to stdout and
+// exiting, so they can be used by both the CLI (main.go) and the shared library (lib.go).
+
+const ledgerDir = "/tmp/jig"
+const ledgerFilename = ledgerDir + "/jig_ledger.sqlite3"
+
+var genesisHash crypto.Digest
+var rewardsPool basics.Address
+var feeSink basics.Address
+
+// ledgerLogLevel is the go-algorand log level. The library keeps it at Warn so the ledger's debug
+// logging doesn't flood the stderr of the host process; the CLI raises it to Debug in main.
+var ledgerLogLevel = logging.Warn
+
+func init() {
+	copy(genesisHash[:], []byte("\x9b\x01\x08\xe3\xf2Q-6\x1f\xd9\x01z\x9c\x07\x8a`\xe3\x8dR\xc5D\xe9<W\xeb\xd89\xa9\xb9\xdfw@"))
+	copy(rewardsPool[:], []byte("\x85\x0b{X.k<6l\xe2[\xc0\xae/\x10N\xa3?\x9f\xb9\xb6\xf47\xf6\x10\x1fZ<@Zp<"))
+	copy(feeSink[:], []byte("\xbcCg|\xb4O\xda\xe0\xfanXZF-\xe71\x1b\xf7\xd9\xd2kgD\x1b_\xe0\xdc\x02\xdb<\xee\xf6"))
+
+}
+
+// compileTeal returns the base64 encoded program and the JSON source map, separated by a newline.
+func compileTeal(src []byte) ([]byte, error) {
+	ops, err := logic.AssembleString(string(src))
+	if err != nil {
+		return nil, fmt.Errorf("%v", ops.Errors)
+	}
+	sourcemap := logic.GetSourceMap([]string{""}, ops.OffsetToLine)
+	s, err := json.Marshal(sourcemap)
+	if err != nil {
+		return nil, err
+	}
+	output := []byte(base64.StdEncoding.EncodeToString(ops.Program) + "\n")
+	return append(output, s...), nil
+}
+
+// resetLedger removes any previous ledger and initialises a new one.
+func resetLedger(fn string, blockTimeStamp int64) error {
+	os.RemoveAll(ledgerDir)
+	os.MkdirAll(ledgerDir, 0777)
+	return initLedger(fn, blockTimeStamp)
+}
+
+func initLedger(fn string, blockTimeStamp int64) error {
+	accounts := make(map[basics.Address]basics.AccountData)
+	ledger, err := makeJigLedger(fn, accounts)
+	if err != nil {
+		return err
+	}
+	defer ledger.Close()
+	prev, _ := ledger.BlockHdr(ledger.Latest())
+	// prev.Round = 200
+	block := bookkeeping.MakeBlock(prev)
+	block.TimeStamp = blockTimeStamp
+
+	err = ledger.AddBlock(block, agreement.Certificate{})
+	if err != nil {
+		return err
+	}
+	<-ledger.Wait(block.Round())
+	return nil
+}
+
+type evalOptions struct {
+	// skipVerify skips signature and logic sig verification, like dryrun.
+	skipVerify bool
+	// continueOnError rejects failing groups instead of failing the whole eval.
+	// The other groups are applied and a status is returned for every group.
+	continueOnError bool
+}
+
+// groupStatus is the result of one group in continueOnError mode. It is empty for applied groups.
+type groupStatus struct {
+	_struct struct{} `codec:",omitempty,omitemptyarray"`
+
+	// Stage is "verify", "test" or "apply"
+	Stage string `codec:"stage"`
+	Error string `codec:"error"`
+}
+
+// groupEvaluator is the part of the ledger's block evaluator used by evalGroup.
+type groupEvaluator interface {
+	TestTransactionGroup(txgroup []transactions.SignedTxn) error
+	TransactionGroup(txads []transactions.SignedTxnWithAD) error
+}
+
+// verifyGroups verifies the signatures and logic sigs of all groups concurrently on at most
+// runtime.NumCPU() workers. Verification does not depend on the state changes of earlier groups.
+// If the verified cache is enabled groups that verified in an earlier eval are skipped (see verifycache.go).
+// The error of group i is at index i.
+func verifyGroups(txgroups [][]transactions.SignedTxn, prev *bookkeeping.BlockHeader, l *ledger.Ledger) ([]error, error) {
+	errs := make([]error, len(txgroups))
+	if err := loadVerifiedGroups(); err != nil {
+		return nil, err
+	}
+	workers := runtime.NumCPU()
+	if workers > len(txgroups) {
+		workers = len(txgroups)
+	}
+	useVerifiedCache := verifiedCachePath != ""
+	cache := l.VerifiedTransactionCache()
+	ledgerForSignature := logic.LedgerForSignature(l)
+	digests := make([]crypto.Digest, len(txgroups))
+	verified := make([]bool, len(txgroups))
+	groupIndexes := make(chan int)
+	var wg sync.WaitGroup
+	for w := 0; w < workers; w++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range groupIndexes {
+				if useVerifiedCache {
+					digests[i] = groupDigest(txgroups[i], prev)
+					if isVerified(digests[i]) {
+						continue
+					}
+				}
+				_, errs[i] = verify.TxnGroup(txgroups[i], prev, cache, ledgerForSignature)
+				verified[i] = errs[i] == nil
+			}
+		}()
+	}
+	for i := range txgroups {
+		groupIndexes <- i
+	}
+	close(groupIndexes)
+	wg.Wait()
+
+	var newDigests []crypto.Digest
+	for i, ok := range verified {
+		if ok && useVerifiedCache {
+			newDigests = append(newDigests, digests[i])
+		}
+	}
+	return errs, addVerifiedGroups(newDigests)
+}
+
+// evalGroup applies one group that has been verified with verifyErr as the result. If it fails the
+// evaluator state is unchanged because TransactionGroup only commits its child state on success.
+// Returns the failing stage and the error.
+func evalGroup(eval groupEvaluator, txgroup []transactions.SignedTxn, verifyErr error) (string, error) {
+	if verifyErr != nil {
+		return "verify", verifyErr
+	}
+
+	err := eval.TestTransactionGroup(txgroup)
+	if err != nil {
+		return "test", err
+	}
+	txads := make([]transactions.SignedTxnWithAD, 0, len(txgroup))
+	for _, txn := range txgroup {
+		txad := transactions.SignedTxnWithAD{SignedTxn: txn, ApplyData: transactions.ApplyData{}}
+		txads = append(txads, txad)
+	}
+	err = eval.TransactionGroup(txads)
+	if err != nil {
+		return "apply", err
+	}
+	return "", nil
+}
+
+// evalTransactions evaluates the msgpack encoded signed transactions in stxns as a new block.
+// It returns the msgpack encoded block, the changed accounts and the changed boxes, concatenated,
+// followed by the group statuses in continueOnError mode.
+func evalTransactions(fn string, stxnsMsgp []byte, opts evalOptions) ([]byte, error) {
+	ledger, err := openJigLedger(fn)
+	if err != nil {
+		return nil, err
+	}
+	defer ledger.Close()
+
+	prev, _ := ledger.BlockHdr(ledger.Latest())
+	block := bookkeeping.MakeBlock(prev)
+	eval, err := ledger.StartEvaluator(block.BlockHeader, 0, 0, nil)
+	if err != nil {
+		return nil, err
+	}
+
+	var addresses []basics.Address
+
+	var stxns []transactions.SignedTxn
+	dec := protocol.NewDecoderBytes(stxnsMsgp)
+	for {
+		var st transactions.SignedTxn
+		err := dec.Decode(&st)
+		if err == io.EOF {
+			break
+		}
+		if err != nil {
+			return nil, err
+		}
+		addresses = append(addresses, st.Txn.RelevantAddrs(transactions.SpecialAddresses{})...)
+		addresses = append(addresses, st.Txn.Accounts...)
+		if st.Txn.ApplicationID > 0 {
+			a, _, err := ledger.GetCreator(basics.CreatableIndex(st.Txn.ApplicationID), basics.AppCreatable)
+			if err == nil {
+				addresses = append(addresses, a)
+			}
+		}
+		stxns = append(stxns, st)
+	}
+	txgroups := bookkeeping.SignedTxnsToGroups(stxns)
+
+	verifyErrs := make([]error, len(txgroups))
+	if !opts.skipVerify {
+		verifyErrs, err = verifyGroups(txgroups, &prev, ledger)
+		if err != nil {
+			return nil, err
+		}
+	}
+
+	statuses := make([]groupStatus, len(txgroups))
+	for i, txgroup := range txgroups {
+		stage, err := evalGroup(eval, txgroup, verifyErrs[i])
+		if err != nil {
+			if !opts.continueOnError {
+				return nil, err
+			}
+			statuses[i] = groupStatus{Stage: stage, Error: err.Error()}
+		}
+	}
+
+	vb, err := eval.GenerateBlock()
+	if err != nil {
+		return nil, err
+	}
+
+	block = vb.Block()
+	err = ledger.AddBlock(block, agreement.Certificate{Round: block.Round()})
+	if err != nil {
+		return nil, err
+	}
+
+	<-ledger.Wait(block.Round())
+
+	// Every account changed by the block is in the block delta, including asset and app creators
+	// and app accounts. Using the delta keeps this independent of the magnitude of asset/app ids.
+	// ModifiedAccounts only has accounts whose base record changed. Changes to asset params or app
+	// global state alone (e.g. an asset reconfigured by its manager, or an app called by an inner
+	// transaction) only change a resource of the creator, so resource deltas are added too.
+	delta := vb.Delta()
+	addresses = append(addresses, delta.Accts.ModifiedAccounts()...)
+	for _, rec := range delta.Accts.GetAllAssetResources() {
+		addresses = append(addresses, rec.Addr)
+	}
+	for _, rec := range delta.Accts.GetAllAppResources() {
+		addresses = append(addresses, rec.Addr)
+	}
+	for _, mc := range delta.Creatables {
+		addresses = append(addresses, mc.Creator)
+	}
+
+	// Lookup account data for all addresses
+	accounts := make(map[basics.Address]basics.AccountData)
+	for _, address := range addresses {
+		if _, ok := accounts[address]; ok {
+			continue
+		}
+		data, _, _, err := ledger.LookupLatest(address)
+		if err != nil {
+			return nil, err
+		}
+		accounts[address] = data
+	}
+
+	// Collect only the boxes modified in this block.
+	// Deleted boxes are encoded as nil so the caller can remove them.
+	boxes := make(map[string]interface{})
+	for key, mod := range delta.KvMods {
+		if mod.Data == nil {
+			boxes[key] = nil
+		} else {
+			boxes[key] = mod.Data
+		}
+	}
+
+	// For some reason updates are NOT written to the accounts tracker db here.
+
+	objs := []interface{}{block, accounts, boxes}
+	if opts.continueOnError {
+		objs = append(objs, statuses)
+	}
+	var output []byte
+	for _, obj := range objs {
+		msgp, err := encode(obj)
+		if err != nil {
+			return nil, err
+		}
+		output = append(output, msgp...)
+	}
+	return output, nil
+}
+
+func encode(obj interface{}) ([]byte, error) {
+	var output []byte
+	enc := codec.NewEncoderBytes(&output, protocol.CodecHandle)
+
+	err := enc.Encode(obj)
+	if err != nil {
+		return nil, fmt.Errorf("failed to encode object: %v", err)
+	}
+	return output, nil
+}
+
+func makeJigLedger(fn string, initAccounts map[basics.Address]basics.AccountData) (*ledger.Ledger, error) {
+	var poolData basics.AccountData
+	poolData.MicroAlgos.Raw = 10_000_000_000_000_000
+	initAccounts[rewardsPool] = poolData
+
+	var feeData basics.AccountData
+	feeData.MicroAlgos.Raw = 0
+	initAccounts[feeSink] = feeData
+
+	initBlock := bookkeeping.Block{
+		BlockHeader: bookkeeping.BlockHeader{
+			GenesisID:   "algojig",
+			GenesisHash: genesisHash,
+			UpgradeState: bookkeeping.UpgradeState{
+				CurrentProtocol: protocol.ConsensusFuture,
+			},
+			RewardsState: bookkeeping.RewardsState{
+				FeeSink:     feeSink,
+				RewardsPool: rewardsPool,
+			},
+		},
+	}
+
+	genesisInitState := ledgercore.InitState{Block: initBlock, Accounts: initAccounts, GenesisHash: genesisHash}
+	cfg := config.GetDefaultLocal()
+	cfg.Archival = true
+	cfg.LedgerSynchronousMode = 3
+	cfg.AccountsRebuildSynchronousMode = 3
+	log := logging.Base()
+	log.SetLevel(ledgerLogLevel)
+	return ledger.OpenLedger(log, fn, false, genesisInitState, cfg)
+}
+
+func openJigLedger(fn string) (*ledger.Ledger, error) {
+	return makeJigLedger(fn, make(map[basics.Address]basics.AccountData))
+}
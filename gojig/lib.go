@@ -0,0 +1,78 @@
+package main
+
+/*
+#include <stdlib.h>
+*/
+import "C"
+
+import (
+	"fmt"
+	"unsafe"
+)
+
+// C ABI for building gojig as a shared library (go build -buildmode=c-shared).
+//
+// Each function returns 0 on success and sets *out to the result, or returns 1 and sets *out to an
+// error message. *out is allocated with malloc and must be released with AlgojigFree.
+// The ledger lives in the same directory as for the CLI so the Python side writes state the same way.
+
+func setOutput(out **C.char, outLen *C.int, data []byte, err error) C.int {
+	rc := C.int(0)
+	if err != nil {
+		data = []byte(err.Error())
+		rc = 1
+	}
+	*out = (*C.char)(C.CBytes(data))
+	*outLen = C.int(len(data))
+	return rc
+}
+
+// recoverPanic turns a panic inside go-algorand into an error instead of crashing the host process.
+func recoverPanic(out **C.char, outLen *C.int, rc *C.int) {
+	if r := recover(); r != nil {
+		*rc = setOutput(out, outLen, nil, fmt.Errorf("panic: %v", r))
+	}
+}
+
+//export AlgojigInit
+func AlgojigInit(blockTimeStamp C.longlong, out **C.char, outLen *C.int) (rc C.int) {
+	defer recoverPanic(out, outLen, &rc)
+	return setOutput(out, outLen, nil, resetLedger(ledgerFilename, int64(blockTimeStamp)))
+}
+
+// Eval flags
+const (
+	evalSkipVerify      = 1
+	evalContinueOnError = 2
+)
+
+//export AlgojigEval
+func AlgojigEval(stxns *C.char, stxnsLen C.int, flags C.int, out **C.char, outLen *C.int) (rc C.int) {
+	defer recoverPanic(out, outLen, &rc)
+	opts := evalOptions{skipVerify: flags&evalSkipVerify != 0, continueOnError: flags&evalContinueOnError != 0}
+	output, err := evalTransactions(ledgerFilename, C.GoBytes(unsafe.Pointer(stxns), stxnsLen), opts)
+	return setOutput(out, outLen, output, err)
+}
+
+// AlgojigSetVerifiedCache sets the file used to persist the digests of verified groups. See verifycache.go.
+//
+//export AlgojigSetVerifiedCache
+func AlgojigSetVerifiedCache(path *C.char, pathLen C.int, out **C.char, outLen *C.int) (rc C.int) {
+	defer recoverPanic(out, outLen, &rc)
+	verifiedGroups.Lock()
+	verifiedCachePath = C.GoStringN(path, pathLen)
+	verifiedGroups.Unlock()
+	return setOutput(out, outLen, nil, nil)
+}
+
+//export AlgojigCompile
+func AlgojigCompile(src *C.char, srcLen C.int, out **C.char, outLen *C.int) (rc C.int) {
+	defer recoverPanic(out, outLen, &rc)
+	output, err := compileTeal(C.GoBytes(unsafe.Pointer(src), srcLen))
+	return setOutput(out, outLen, output, err)
+}
+
+//export AlgojigFree
+func AlgojigFree(p unsafe.Pointer) {
+	C.free(p)
+}
@@ -0,0 +1,115 @@
+package main
+
+import (
+	"encoding/binary"
+	"io/ioutil"
+	"os"
+	"sync"
+
+	"github.com/algorand/go-algorand/crypto"
+	"github.com/algorand/go-algorand/data/bookkeeping"
+	"github.com/algorand/go-algorand/data/transactions"
+	"github.com/algorand/go-algorand/protocol"
+)
+
+// verifiedGroups holds the digests of transaction groups that passed verify.TxnGroup.
+// Signature and multisig checks depend only on the group. Logic sigs can also read block headers
+// through LedgerForSignature (e.g. txn FirstValidTime), and the jig ledger has a single block after
+// genesis, so the round and timestamp of that block are part of the digest. The consensus protocol
+// is fixed in this binary.
+// The cache is opt-in: it is only used when verifiedCachePath is set. The set is then loaded from
+// and appended to that file so it persists across runs of the binary, and it is kept in memory
+// between evals when gojig is used as a shared library.
+var verifiedGroups = struct {
+	sync.Mutex
+	digests map[crypto.Digest]bool
+	// the file loaded into digests
+	loadedPath string
+	// the number of digests in the file
+	fileCount int
+}{digests: make(map[crypto.Digest]bool)}
+
+var verifiedCachePath string
+
+// maxVerifiedGroups bounds the verified groups file. When it grows beyond this the oldest half of
+// the digests is dropped.
+const maxVerifiedGroups = 1 << 20
+
+func groupDigest(txgroup []transactions.SignedTxn, prev *bookkeeping.BlockHeader) crypto.Digest {
+	buf := make([]byte, 16)
+	binary.BigEndian.PutUint64(buf, uint64(prev.Round))
+	binary.BigEndian.PutUint64(buf[8:], uint64(prev.TimeStamp))
+	for i := range txgroup {
+		buf = append(buf, protocol.Encode(&txgroup[i])...)
+	}
+	return crypto.Hash(buf)
+}
+
+func isVerified(digest crypto.Digest) bool {
+	verifiedGroups.Lock()
+	defer verifiedGroups.Unlock()
+	return verifiedGroups.digests[digest]
+}
+
+// loadVerifiedGroups reads the digests of verifiedCachePath, a file of concatenated 32 byte digests
+// in the order they were added. A file with more than maxVerifiedGroups digests is compacted.
+func loadVerifiedGroups() error {
+	verifiedGroups.Lock()
+	defer verifiedGroups.Unlock()
+	if verifiedCachePath == "" || verifiedCachePath == verifiedGroups.loadedPath {
+		return nil
+	}
+	data, err := ioutil.ReadFile(verifiedCachePath)
+	if err != nil && !os.IsNotExist(err) {
+		return err
+	}
+	data = data[:len(data)-len(data)%crypto.DigestSize]
+	if len(data) > maxVerifiedGroups*crypto.DigestSize {
+		data = data[len(data)-maxVerifiedGroups/2*crypto.DigestSize:]
+		tmpPath := verifiedCachePath + ".tmp"
+		if err := ioutil.WriteFile(tmpPath, data, 0666); err != nil {
+			return err
+		}
+		if err := os.Rename(tmpPath, verifiedCachePath); err != nil {
+			return err
+		}
+	}
+	verifiedGroups.digests = make(map[crypto.Digest]bool)
+	for i := 0; i < len(data); i += crypto.DigestSize {
+		var digest crypto.Digest
+		copy(digest[:], data[i:i+crypto.DigestSize])
+		verifiedGroups.digests[digest] = true
+	}
+	verifiedGroups.loadedPath = verifiedCachePath
+	verifiedGroups.fileCount = len(data) / crypto.DigestSize
+	return nil
+}
+
+// addVerifiedGroups adds newly verified digests to the set and appends them to verifiedCachePath.
+func addVerifiedGroups(digests []crypto.Digest) error {
+	if len(digests) == 0 {
+		return nil
+	}
+	verifiedGroups.Lock()
+	defer verifiedGroups.Unlock()
+	var data []byte
+	for _, digest := range digests {
+		verifiedGroups.digests[digest] = true
+		data = append(data, digest[:]...)
+	}
+	f, err := os.OpenFile(verifiedCachePath, os.O_APPEND|os.O_CREATE|os.O_WRONLY, 0666)
+	if err != nil {
+		return err
+	}
+	defer f.Close()
+	// a single write of whole digests so concurrent writers don't interleave partial digests
+	if _, err = f.Write(data); err != nil {
+		return err
+	}
+	verifiedGroups.fileCount += len(digests)
+	if verifiedGroups.fileCount > maxVerifiedGroups {
+		// compact and reload on the next eval
+		verifiedGroups.loadedPath = ""
+	}
+	return nil
+}
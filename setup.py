@@ -14,11 +14,14 @@ setup(
     keywords=KEYWORDS,
     license=LICENSE,
     packages=["algojig"],
-    package_data={"algojig": ["algojig*"]},
+    package_data={"algojig": ["algojig*", "libalgojig*"]},
     include_package_data=True,
     install_requires=[
         "py-algorand-sdk>=2.0.0",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
     has_ext_modules=lambda: True,
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
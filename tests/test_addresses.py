@@ -0,0 +1,22 @@
+import unittest
+
+from algojig import addresses
+from algosdk import encoding, logic
+from algosdk.account import generate_account
+
+
+class TestAddresses(unittest.TestCase):
+
+    def test_matches_algosdk(self):
+        _, address = generate_account()
+        public_key = encoding.decode_address(address)
+        self.assertEqual(addresses.decode_address(address), public_key)
+        self.assertEqual(addresses.encode_address(public_key), address)
+        self.assertEqual(addresses.get_application_address(7), logic.get_application_address(7))
+        self.assertIsNone(addresses.encode_address(None))
+        self.assertIsNone(addresses.decode_address(None))
+
+    def test_interned(self):
+        _, address = generate_account()
+        public_key = encoding.decode_address(address)
+        self.assertIs(addresses.encode_address(public_key), addresses.encode_address(bytes(public_key)))
@@ -0,0 +1,55 @@
+import unittest
+
+from algojig.blocks import ZERO_ADDRESS, flatten_blocks, iter_transactions, to_numpy
+
+A = b'a' * 32
+B = b'b' * 32
+
+
+class TestBlocks(unittest.TestCase):
+
+    def setUp(self):
+        inner_pay = {b'txn': {b'type': b'pay', b'snd': B, b'rcv': A, b'amt': 5}}
+        inner_axfer = {b'txn': {b'type': b'axfer', b'snd': B, b'arcv': A, b'xaid': 10, b'aamt': 7}}
+        self.blocks = [
+            {b'rnd': 2, b'txns': [
+                {b'txn': {b'type': b'pay', b'snd': A, b'rcv': B, b'amt': 100, b'fee': 1000}},
+                {
+                    b'txn': {b'type': b'appl', b'snd': A, b'apid': 3, b'fee': 3000},
+                    b'dt': {b'lg': [b'x', b'y'], b'itx': [inner_pay, inner_axfer]},
+                },
+            ]},
+            {b'rnd': 3, b'txns': [
+                {b'txn': {b'type': b'acfg', b'snd': A, b'fee': 1000}, b'caid': 11},
+            ]},
+        ]
+
+    def test_iter_transactions(self):
+        paths = [path for path, _ in iter_transactions(self.blocks[0])]
+        self.assertEqual(paths, [(0,), (1,), (1, 0), (1, 1)])
+
+    def test_flatten_blocks(self):
+        table = flatten_blocks(self.blocks)
+        self.assertEqual(list(table['round']), [2, 2, 2, 2, 3])
+        self.assertEqual(table['path'], [(0,), (1,), (1, 0), (1, 1), (0,)])
+        self.assertEqual(list(table['parent']), [-1, -1, 1, 1, -1])
+        self.assertEqual(list(table['depth']), [0, 0, 1, 1, 0])
+        self.assertEqual(table['type'], ['pay', 'appl', 'pay', 'axfer', 'acfg'])
+        self.assertEqual(table['receiver'], [B, ZERO_ADDRESS, A, A, ZERO_ADDRESS])
+        self.assertEqual(list(table['amount']), [100, 0, 5, 7, 0])
+        self.assertEqual(list(table['asset_id']), [0, 0, 0, 10, 11])
+        self.assertEqual(list(table['app_id']), [0, 3, 0, 0, 0])
+        self.assertEqual(list(table['log_count']), [0, 2, 0, 0, 0])
+        self.assertEqual(list(table['inner_count']), [0, 2, 0, 0, 0])
+        self.assertEqual(sum(table['fee']), 5000)
+
+    def test_to_numpy(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        arrays = to_numpy(flatten_blocks(self.blocks))
+        self.assertEqual(arrays['amount'][arrays['type'] == 'pay'].sum(), 105)
+        self.assertEqual(arrays['sender'].dtype.itemsize, 32)
+        self.assertEqual(arrays['path'].shape, (5,))
+        self.assertEqual(arrays['parent'].dtype.kind, 'i')
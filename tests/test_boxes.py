@@ -0,0 +1,95 @@
+import sqlite3
+import unittest
+
+from algojig.boxes import MemoryBoxStore, SqliteBoxStore, box_kv_key
+
+
+class TestBoxStores(unittest.TestCase):
+    """The tests common to both box stores are run for each store in a subTest."""
+
+    def make_stores(self):
+        sqlite_store = SqliteBoxStore()
+        self.addCleanup(sqlite_store.close)
+        return [MemoryBoxStore(), sqlite_store]
+
+    def test_set_get(self):
+        for store in self.make_stores():
+            with self.subTest(store=type(store).__name__):
+                store.set_box(1, b'a', b'xyz')
+                self.assertEqual(bytes(store.get_box(1, b'a')), b'xyz')
+                self.assertTrue(store.box_exists(1, b'a'))
+                self.assertFalse(store.box_exists(1, b'b'))
+                self.assertFalse(store.box_exists(2, b'a'))
+
+    def test_stats(self):
+        for store in self.make_stores():
+            with self.subTest(store=type(store).__name__):
+                store.set_box(1, b'a', b'xyz')
+                store.set_box(1, b'bb', b'1234')
+                self.assertEqual(tuple(store.get_box_stats(1)), (2, 10))
+                store.set_box(1, b'a', b'x')
+                self.assertEqual(tuple(store.get_box_stats(1)), (2, 8))
+                store.delete_box(1, b'bb')
+                self.assertEqual(tuple(store.get_box_stats(1)), (1, 2))
+                self.assertEqual(tuple(store.get_box_stats(2)), (0, 0))
+
+    def test_apply_box_mods(self):
+        for store in self.make_stores():
+            with self.subTest(store=type(store).__name__):
+                store.set_box(1, b'a', b'xyz')
+                store.set_box(1, b'b', b'xyz')
+                store.apply_box_mods({
+                    box_kv_key(1, b'a'): None,
+                    box_kv_key(1, b'c'): b'new',
+                    box_kv_key(1, b'd'): None,
+                })
+                self.assertEqual(sorted(store.get_box_keys(1)), [b'b', b'c'])
+
+    def test_write_kvstore(self):
+        for store in self.make_stores():
+            with self.subTest(store=type(store).__name__):
+                store.set_box(1, b'a', b'xyz')
+                store.set_box(2, b'b', b'')
+                db = sqlite3.connect(':memory:')
+                db.execute('CREATE TABLE kvstore (key BLOB PRIMARY KEY, value BLOB)')
+                store.write_kvstore(db)
+                rows = db.execute('SELECT key, value FROM kvstore ORDER BY key').fetchall()
+                self.assertEqual(rows, [(box_kv_key(1, b'a'), b'xyz'), (box_kv_key(2, b'b'), b'')])
+
+
+class TestMemoryBoxStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryBoxStore()
+
+    def test_set_box_mutates_existing_value(self):
+        self.store.set_box(1, b'a', b'xyz')
+        value = self.store.get_box(1, b'a')
+        self.store.set_box(1, b'a', b'abc')
+        self.assertEqual(value, b'abc')
+        self.assertEqual(self.store, {1: {b'a': bytearray(b'abc')}})
+
+    def test_read_only(self):
+        self.store.set_box(1, b'a', b'xyz')
+        with self.assertRaises(TypeError):
+            self.store[1][b'b'] = bytearray(b'x')
+        with self.assertRaises(TypeError):
+            self.store[2] = {}
+        with self.assertRaises(TypeError):
+            del self.store[1]
+        self.assertEqual(self.store.get_box_stats(1), (1, 4))
+        self.assertEqual(self.store.get_box_keys(1), [b'a'])
+
+
+class TestSqliteBoxStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = SqliteBoxStore()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_read_box(self):
+        self.store.set_box(1, b'a', bytes(range(100)))
+        self.assertIsInstance(self.store.get_box(1, b'a'), memoryview)
+        self.assertEqual(bytes(self.store.read_box(1, b'a', offset=10, size=3)), b'\x0a\x0b\x0c')
@@ -0,0 +1,63 @@
+import unittest
+
+from algojig import JigLedger, generate_accounts
+from algojig.teal import TealProgram
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+secrets, addresses = generate_accounts(3)
+
+
+class FakeProgram(TealProgram):
+    def __init__(self):
+        super().__init__(bytecode=b'\x06\x81\x01')
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestBulkState(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = JigLedger()
+        self.ledger.create_asset(10)
+        self.ledger.set_account_balance(addresses[0], 5, asset_id=10)
+        self.ledger.set_account_balance(addresses[1], 0, asset_id=10)
+        self.ledger.set_account_balance(addresses[2], 1_000_000)
+        self.ledger.create_app(1, approval_program=FakeProgram())
+        self.ledger.set_local_state(addresses[0], 1, {b'count': 3, b'name': b'x'})
+        self.ledger.set_local_state(addresses[1], 1, {})
+
+    def test_get_asset_holders(self):
+        holders, balances = self.ledger.get_asset_holders(10)
+        balances = dict(zip(holders, balances))
+        self.assertEqual(balances[addresses[0]], 5)
+        self.assertEqual(balances[addresses[1]], 0)
+        self.assertNotIn(addresses[2], balances)
+        self.assertEqual(balances[self.ledger.creator], 2**64 - 1)
+        self.assertEqual(balances[self.ledger.creator].dtype, numpy.uint64)
+
+    def test_get_local_state_values(self):
+        holders, values = self.ledger.get_local_state_values(1, 'count')
+        self.assertEqual(list(holders), [addresses[0]])
+        self.assertEqual(values.dtype, numpy.uint64)
+        holders, values = self.ledger.get_local_state_values(1, b'count', default=0)
+        self.assertEqual(dict(zip(holders, values.tolist())), {addresses[0]: 3, addresses[1]: 0})
+        holders, values = self.ledger.get_local_state_values(1, b'name')
+        self.assertEqual(values.tolist(), [b'x'])
+
+    def test_columns_follow_changes(self):
+        self.ledger.set_account_balance(addresses[0], 7, asset_id=10)
+        self.ledger.set_local_state(addresses[0], 1, {b'count': b'three'})
+        self.ledger.set_local_state(addresses[1], 1, {b'count': 4})
+        holders, balances = self.ledger.get_asset_holders(10)
+        self.assertEqual(dict(zip(holders, balances.tolist()))[addresses[0]], 7)
+        holders, values = self.ledger.get_local_state_values(1, b'count')
+        self.assertEqual(dict(zip(holders, values.tolist())), {addresses[0]: b'three', addresses[1]: 4})
+        holders, values = self.ledger.get_local_state_values(1, b'name')
+        self.assertEqual(len(holders), 0)
+        self.ledger.set_local_state(addresses[0], 1, {b'count': 1})
+        holders, values = self.ledger.get_local_state_values(1, b'count')
+        self.assertEqual(values.dtype, numpy.uint64)
+        self.assertEqual(list(holders), sorted(addresses[:2]))
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from algojig import JigLedger, generate_accounts, get_suggested_params, gojig
+from algojig.cache import EvalCache
+from algosdk.transaction import PaymentTxn
+
+sp = get_suggested_params()
+secrets, addresses = generate_accounts(2)
+
+
+class TestEvalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = EvalCache(self.dir.name, max_size=1000)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_get_set(self):
+        result = {
+            'block': {b'txns': [{b'txn': {b'amt': 1}}]},
+            'accounts': {'ADDRESS': {b'algo': 100, b'asset': {10: {b'a': 1}}}},
+            'boxes': {b'bx:key': b'value', b'bx:deleted': None},
+        }
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', result)
+        self.assertEqual(self.cache.get('key'), result)
+
+    def test_concurrent_set(self):
+        self.cache.max_size = 10 ** 6
+        errors = []
+
+        def write(i):
+            try:
+                for _ in range(5):
+                    self.cache.set('key', {'block': i})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertIn(self.cache.get('key')['block'], range(4))
+        self.assertEqual(os.listdir(self.dir.name), ['key.msgpack'])
+
+    def test_evict_least_recently_used(self):
+        value = {'block': b'x' * 400}
+        self.cache.set('a', value)
+        self.cache.set('b', value)
+        # make 'a' the most recently used entry
+        past = time.time() - 10
+        os.utime(os.path.join(self.dir.name, 'b.msgpack'), (past, past))
+        self.cache.get('a')
+        self.cache.set('c', value)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+class TestLedgerEvalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def make_ledger(self):
+        ledger = JigLedger(eval_cache=EvalCache(self.dir.name))
+        ledger.set_account_balance(addresses[0], 1_000_000)
+        return ledger
+
+    def test_creator(self):
+        # the fixed creator is only used with an eval cache
+        self.assertNotEqual(JigLedger().creator, JigLedger().creator)
+        self.assertEqual(self.make_ledger().creator, self.make_ledger().creator)
+
+    def test_identical_ledgers_hit(self):
+        self.assertEqual(self.make_ledger().state_hash(), self.make_ledger().state_hash())
+        transactions = [PaymentTxn(addresses[0], sp, addresses[1], 1_000).sign(secrets[0])]
+        result = {'block': {b'txns': []}, 'accounts': {addresses[1]: {b'algo': 1_000}}, 'boxes': {}}
+        with mock.patch.object(JigLedger, '_eval', return_value=result) as evaluator, \
+                mock.patch.object(gojig, 'binary_version', return_value='version'):
+            self.make_ledger().eval_transactions(transactions)
+            ledger = self.make_ledger()
+            ledger.eval_transactions(transactions)
+        self.assertEqual(evaluator.call_count, 1)
+        self.assertEqual(ledger.get_account_balance(addresses[1]), [1_000, False])
+
+    def test_key_sees_direct_mutation(self):
+        ledger = self.make_ledger()
+        transactions = [PaymentTxn(addresses[0], sp, addresses[1], 1_000).sign(secrets[0])]
+        with mock.patch.object(gojig, 'binary_version', return_value='version'):
+            key = ledger._get_eval_cache_key(transactions, None)
+            ledger.get_account_balance(addresses[0])[0] = 5
+            self.assertNotEqual(ledger._get_eval_cache_key(transactions, None), key)
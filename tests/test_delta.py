@@ -0,0 +1,61 @@
+import unittest
+
+from algojig import JigLedger, generate_accounts
+from algojig.boxes import box_kv_key
+from algojig.delta import compute_state_delta
+from algojig.teal import TealProgram
+
+secrets, addresses = generate_accounts(2)
+
+
+class TestStateDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = JigLedger()
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        self.ledger.set_account_balance(addresses[0], 50, asset_id=10)
+        self.ledger.create_app(1, approval_program=TealProgram(bytecode=b'\x06\x81\x01'))
+        self.ledger.set_global_state(1, {b'a': 1, b'b': b'x'})
+        self.ledger.set_local_state(addresses[0], 1, {b'c': 1})
+        self.ledger.set_box(1, b'box1', b'1')
+        self.ledger.set_box(1, b'box2', b'2')
+
+    def test_compute_state_delta(self):
+        block = {
+            b'txns': [
+                {b'txn': {b'type': b'appl', b'apid': 1}, b'dt': {b'itx': [
+                    {b'txn': {b'type': b'acfg'}, b'caid': 11},
+                ]}},
+            ],
+        }
+        accounts = {
+            addresses[0]: {
+                b'algo': 999_000,
+                b'asset': {10: {b'a': 40}},
+                b'appl': {1: {b'tkv': {b'c': {b'tt': 2, b'ui': 2}}}},
+            },
+            self.ledger.creator: {
+                b'algo': 100_000_000,
+                b'asset': {10: {b'a': 2**64 - 1}},
+                b'appp': {1: {b'gs': {b'a': {b'tt': 2, b'ui': 1}, b'd': {b'tt': 1, b'tb': b'y'}}}},
+            },
+        }
+        box_mods = {
+            box_kv_key(1, b'box1'): None,
+            box_kv_key(1, b'box2'): b'3',
+            box_kv_key(1, b'box3'): b'4',
+        }
+        delta = compute_state_delta(self.ledger, block, accounts, box_mods)
+        self.assertEqual(delta.balances, {
+            (addresses[0], 0): (1_000_000, 999_000),
+            (addresses[0], 10): (50, 40),
+        })
+        self.assertEqual(delta.get_balance_change(addresses[0], 10), -10)
+        self.assertEqual(delta.get_balance_change(addresses[1]), 0)
+        self.assertEqual(delta.local_states, {(addresses[0], 1): {b'c': (1, 2)}})
+        self.assertEqual(delta.global_states, {1: {b'b': (b'x', None), b'd': (None, b'y')}})
+        self.assertEqual(delta.deleted_boxes, [(1, b'box1')])
+        self.assertEqual(delta.updated_boxes, {(1, b'box2'): b'3'})
+        self.assertEqual(delta.created_boxes, {(1, b'box3'): b'4'})
+        self.assertEqual(delta.created_assets, [11])
+        self.assertEqual(delta.created_apps, [])
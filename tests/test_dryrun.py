@@ -0,0 +1,286 @@
+import base64
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from algojig import generate_accounts, get_suggested_params
+from algojig.dryrun import AVM, LATEST_TIMESTAMP, AlgodSession, AppCallReject, LocalModeWarning
+from algojig.teal import TealProgram
+from algosdk.encoding import msgpack_encode
+from algosdk.transaction import ApplicationNoOpTxn, LogicSigAccount, LogicSigTransaction, PaymentTxn
+from algosdk.v2client import models
+from algosdk.v2client.algod import AlgodClient
+
+sp = get_suggested_params()
+secrets, addresses = generate_accounts(2)
+
+
+class TestLocalAVM(unittest.TestCase):
+
+    def setUp(self):
+        self.avm = AVM()
+        self.avm.set_account_balance(addresses[0], 1_000_000)
+
+    def test_pass_app_call(self):
+        program = TealProgram(teal='#pragma version 8\nbyte "hello"\nlog\nint 1\nreturn\n')
+        self.avm.set_app(1, approval_program=program)
+        txn = ApplicationNoOpTxn(addresses[0], sp, 1).sign(secrets[0])
+        results = self.avm.app_calls([txn])
+        self.assertEqual(results[0].result, 'PASS')
+        self.assertEqual(results[0].logs, [b'hello'])
+        self.assertEqual(results[0].reason, 'PASS from program')
+        with self.assertWarns(LocalModeWarning):
+            self.assertIsNone(results[0].cost)
+
+    def test_fail_app_call(self):
+        program = TealProgram(teal='#pragma version 8\nint 1\nint 2\n==\nassert\nint 1\nreturn\n')
+        self.avm.set_app(1, approval_program=program)
+        txn = ApplicationNoOpTxn(addresses[0], sp, 1).sign(secrets[0])
+        results = self.avm.app_calls([txn])
+        self.assertEqual(results[0].result, 'REJECT')
+        self.assertTrue(results[0].reason.startswith('Error in program:'))
+        with self.assertRaises(AppCallReject):
+            self.avm.eval_transactions([txn])
+
+    def test_pass_logic_sig_group(self):
+        lsig = LogicSigAccount(TealProgram(teal='#pragma version 8\nint 1\n').bytecode)
+        self.avm.set_account_balance(lsig.address(), 1_000_000)
+        txn = LogicSigTransaction(PaymentTxn(lsig.address(), sp, addresses[0], 1_000), lsig)
+        with self.assertWarns(LocalModeWarning):
+            self.assertEqual(self.avm.app_calls([txn]), {})
+        self.avm.eval_transactions([txn])
+        self.assertEqual(self.avm.get_balance(addresses[0]), 1_001_000)
+
+
+class FakeProgram(TealProgram):
+    def __init__(self):
+        super().__init__(bytecode=b'\x06\x81\x01')
+
+
+class TestLocalAVMState(unittest.TestCase):
+
+    def test_ledger_is_reused_until_state_changes(self):
+        avm = AVM()
+        avm.set_app(1, approval_program=FakeProgram())
+        avm.set_account_balance(addresses[0], 1_000_000)
+        ledger = avm.make_ledger()
+        self.assertIs(avm.make_ledger(), ledger)
+        self.assertEqual(ledger.get_account_balance(addresses[0]), [1_000_000, False])
+        avm.move(addresses[0], addresses[1], 0, 1_000)
+        ledger = avm.make_ledger()
+        self.assertEqual(ledger.get_account_balance(addresses[1]), [1_000, False])
+        avm.set_app(2, approval_program=FakeProgram())
+        self.assertIn(2, avm.make_ledger().apps)
+
+    def test_trace_fields_warn(self):
+        result = AVM()._new_response([])
+        with self.assertWarns(LocalModeWarning):
+            self.assertIsNone(result.stack)
+        self.assertEqual(result.result, 'PASS')
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.ports.append(self.client_address[1])
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # close the connection without telling the client, like an idle timeout
+        self.close_connection = self.server.close_connection
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDryrunRequest(unittest.TestCase):
+
+    def test_encode_matches_algosdk(self):
+        avm = AVM()
+        avm.set_app(1, approval_program=FakeProgram())
+        avm.set_account_balance(addresses[0], 1_000_000)
+        avm.set_account_balance(addresses[0], 5, asset_id=10)
+        avm.set_account_local_state(addresses[0], 1, {b'a': 1, b'b': b'x'})
+        txn_group = [
+            PaymentTxn(addresses[0], sp, addresses[1], 1).sign(secrets[0]),
+            ApplicationNoOpTxn(addresses[0], sp, 1).sign(secrets[0]),
+        ]
+        apps = [
+            models.Application(
+                id=1,
+                params=models.ApplicationParams(
+                    creator=avm.creator,
+                    approval_program=b'\x06\x81\x01',
+                    clear_state_program='',
+                    local_state_schema=models.ApplicationStateSchema(16, 16),
+                    global_state_schema=models.ApplicationStateSchema(64, 64),
+                ),
+            )
+        ]
+        accounts = [
+            models.Account(
+                address=addresses[0],
+                amount=1_000_000,
+                amount_without_pending_rewards=1_000_000,
+                status='Online',
+                apps_local_state=[
+                    models.ApplicationLocalState(id=1, schema=models.ApplicationStateSchema(16, 16), key_value=[
+                        models.TealKeyValue(base64.b64encode(b'a').decode(), models.TealValue(type=2, uint=1)),
+                        models.TealKeyValue(base64.b64encode(b'b').decode(), models.TealValue(type=1, bytes=b'x')),
+                    ]),
+                ],
+                assets=[{'amount': 5, 'asset-id': 10}],
+            ),
+            models.Account(
+                address='BLITMUHUPIO33MDDVQHUOYTGDUXRSGY2SDSY76DZDYEC5C2S7ZISLPMROQ',
+                amount=10_000_000,
+                amount_without_pending_rewards=10_000_000,
+                status='Online',
+                created_assets=[models.Asset(10, models.AssetParams())],
+            ),
+            models.Account(
+                address=avm.creator,
+                amount=10_000_000,
+                amount_without_pending_rewards=10_000_000,
+                status='Online',
+                created_apps=apps,
+            ),
+        ]
+        for transaction_index in (0, 1):
+            drr = {
+                'accounts': [x.dictify() for x in accounts],
+                'txns': [x.dictify() for x in txn_group],
+                'apps': [x.dictify() for x in apps],
+                'txn-index': transaction_index,
+                'latest-timestamp': LATEST_TIMESTAMP,
+            }
+            self.assertEqual(
+                avm._encode_dryrun_request(txn_group, transaction_index),
+                base64.b64decode(msgpack_encode(drr)),
+            )
+
+    def post_twice(self, close_connection):
+        server = HTTPServer(('127.0.0.1', 0), EchoHandler)
+        server.ports = []
+        server.close_connection = close_connection
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            session = AlgodSession(AlgodClient('token', f'http://127.0.0.1:{server.server_port}'))
+            self.assertEqual(session.post('/teal/dryrun', b'first', {}), b'first')
+            self.assertEqual(session.post('/teal/dryrun', b'second', {}), b'second')
+            session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        return server.ports
+
+    def test_session_reuses_connection(self):
+        ports = self.post_twice(close_connection=False)
+        self.assertEqual(len(ports), 2)
+        self.assertEqual(len(set(ports)), 1)
+
+    def test_session_reconnects(self):
+        ports = self.post_twice(close_connection=True)
+        # the second request was sent again on a new connection
+        self.assertEqual(len(set(ports)), 2)
+
+
+class DryrunHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.requests.append((self.path, self.rfile.read(int(self.headers['Content-Length']))))
+        body = json.dumps(self.server.response).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def dryrun_txn_result(messages, logs=(), trace=()):
+    return {
+        'app-call-messages': messages,
+        'app-call-trace': list(trace),
+        'cost': 3,
+        'logs': [base64.b64encode(log).decode() for log in logs],
+        'global-delta': [{'key': base64.b64encode(b'g').decode(), 'value': {'action': 2, 'uint': 7}}],
+        'local-deltas': [],
+    }
+
+
+class TestDryrunAVM(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), DryrunHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.avm = AVM(AlgodClient('token', f'http://127.0.0.1:{self.server.server_port}'))
+        self.avm.set_app(1, approval_program=FakeProgram())
+        program = FakeProgram()
+        program.source_map = {line: (line, line * 10) for line in range(4)}
+        self.avm.set_app(2, approval_program=program)
+        self.avm.set_account_balance(addresses[0], 1_000_000)
+        self.txn_group = [
+            ApplicationNoOpTxn(addresses[0], sp, 1).sign(secrets[0]),
+            PaymentTxn(addresses[0], sp, addresses[1], 1).sign(secrets[0]),
+            ApplicationNoOpTxn(addresses[0], sp, 2).sign(secrets[0]),
+        ]
+
+    def tearDown(self):
+        self.avm.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_one_request_per_group(self):
+        self.server.response = {
+            'error': '',
+            'protocol-version': 'future',
+            'txns': [
+                dryrun_txn_result(['ApprovalProgram', 'PASS'], logs=[b'one']),
+                {},
+                dryrun_txn_result(['ApprovalProgram', 'PASS'], logs=[b'two', b'three']),
+            ],
+        }
+        results = self.avm.app_calls(self.txn_group)
+        self.assertEqual(len(self.server.requests), 1)
+        path, data = self.server.requests[0]
+        self.assertTrue(path.endswith('/teal/dryrun'))
+        self.assertEqual(data, self.avm._encode_dryrun_request(self.txn_group))
+        self.assertEqual(sorted(results), [0, 2])
+        self.assertEqual(results[0].logs, [b'one'])
+        self.assertEqual(results[2].logs, [b'two', b'three'])
+        self.assertEqual(results[2].response[b'apply-data'], {b'dt': {b'lg': [b'two', b'three']}})
+        self.assertEqual(results[2].global_delta, {b'g': {'action': 2, 'uint': 7}})
+        self.assertEqual(results[0].cost, 3)
+
+        self.avm.eval_transactions(self.txn_group)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.avm.get_balance(addresses[1]), 1)
+
+    def test_reject(self):
+        self.server.response = {
+            'error': '',
+            'txns': [
+                dryrun_txn_result(['ApprovalProgram', 'PASS']),
+                {},
+                dryrun_txn_result(['ApprovalProgram', 'REJECT'], trace=[
+                    {'line': 1, 'pc': 1, 'stack': []},
+                    {'line': 2, 'pc': 2, 'stack': [{'type': 2, 'uint': 0}]},
+                    {'line': 3, 'pc': 3, 'stack': [{'type': 2, 'uint': 0}]},
+                ]),
+            ],
+        }
+        with self.assertRaises(AppCallReject) as e:
+            self.avm.eval_transactions(self.txn_group)
+        self.assertEqual(e.exception.result.stack, [{'type': 2, 'uint': 0}])
+        self.assertEqual(e.exception.reason, 'REJECT from program: 2, teal: 2, tealish: 20')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.avm.get_balance(addresses[1]), 0)
@@ -0,0 +1,85 @@
+import unittest
+
+from algojig import generate_accounts
+from algojig.events import INT_LOG, Event, EventDecoder, get_selector
+from algosdk.abi import ABIType
+from algosdk.encoding import decode_address
+
+_, addresses = generate_accounts(1)
+
+SWAP = 'Swap(address,uint64,uint64)'
+MESSAGE = 'Message(uint64,string)'
+
+
+def swap_log(amount_in, amount_out):
+    data = ABIType.from_string('(address,uint64,uint64)').encode([decode_address(addresses[0]), amount_in, amount_out])
+    return get_selector(SWAP) + data
+
+
+def appl(app_id, logs, inner_txns=()):
+    return {
+        b'txn': {b'type': b'appl', b'apid': app_id},
+        b'dt': {b'lg': logs, b'itx': list(inner_txns)},
+    }
+
+
+class TestEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = EventDecoder([
+            Event(SWAP, ['user', 'amount_in', 'amount_out']),
+            {'name': 'Message', 'args': [{'type': 'uint64', 'name': 'id'}, {'type': 'string'}]},
+        ])
+        message = get_selector(MESSAGE) + ABIType.from_string('(uint64,string)').encode([7, 'hello'])
+        self.blocks = [
+            {b'rnd': 2, b'txns': [
+                appl(1, [swap_log(10, 20), b'price%i' + (5).to_bytes(8, 'big')]),
+                {b'txn': {b'type': b'pay'}},
+                appl(1, [b'unknown'], inner_txns=[appl(2, [message])]),
+            ]},
+            {b'rnd': 3, b'txns': [appl(1, [swap_log(30, 40)])]},
+        ]
+
+    def test_selector(self):
+        self.assertEqual(get_selector('add(uint64,uint64)uint128'), bytes.fromhex('8aa3b61f'))
+
+    def test_iter_events(self):
+        records = list(self.decoder.iter_events(self.blocks))
+        self.assertEqual([(r.round, r.path, r.app_id, r.name) for r in records], [
+            (2, (0,), 1, 'Swap'),
+            (2, (0,), 1, INT_LOG),
+            (2, (2, 0), 2, 'Message'),
+            (3, (0,), 1, 'Swap'),
+        ])
+        self.assertEqual(records[0].args.user, addresses[0])
+        self.assertEqual(records[0].args.amount_out, 20)
+        self.assertEqual(records[1].args, ('price', 5))
+        self.assertEqual(tuple(records[2].args), (7, 'hello'))
+        self.assertEqual(records[2].args._fields, ('id', 'arg1'))
+
+    def test_decode_columns(self):
+        columns = self.decoder.decode_columns(self.blocks, 'Swap')
+        self.assertEqual(list(columns['round']), [2, 3])
+        self.assertEqual(list(columns['amount_in']), [10, 30])
+        self.assertEqual(list(columns['amount_out']), [20, 40])
+        self.assertEqual(columns['user'], [addresses[0], addresses[0]])
+        self.assertEqual(columns['path'], [(0,), (0,)])
+
+    def test_decode_columns_unknown_event(self):
+        with self.assertRaisesRegex(KeyError, 'Transfer'):
+            self.decoder.decode_columns(self.blocks, 'Transfer')
+
+    def test_keyword_arg_names(self):
+        event = Event.from_arc28({'name': 'Transfer', 'args': [
+            {'type': 'address', 'name': 'from'}, {'type': 'address', 'name': 'to'}, {'type': 'uint64', 'name': 'class'},
+        ]})
+        self.assertEqual(event.args_class._fields, ('_0', 'to', '_2'))
+        args = event.decode(ABIType.from_string('(address,address,uint64)').encode([decode_address(addresses[0])] * 2 + [3]))
+        self.assertEqual(args.to, addresses[0])
+        self.assertEqual(args[2], 3)
+
+    def test_fast_path_matches_abi_decode(self):
+        event = Event(SWAP)
+        self.assertIsNotNone(event.struct)
+        data = swap_log(1, 2)[4:]
+        self.assertEqual(event.decode(data), event.args_class._make(event.abi_type.decode(data)))
@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from algojig import gojig
+
+
+class TestGojig(unittest.TestCase):
+
+    def tearDown(self):
+        gojig.use_library = True
+
+    def test_use_binary(self):
+        gojig.use_library = False
+        self.assertIsNone(gojig.get_library())
+
+    @unittest.skipUnless(gojig.load_library(), 'shared library is not built')
+    def test_library_matches_binary(self):
+        teal = '#pragma version 8\nint 1\nreturn\n'
+        result = gojig.compile(teal=teal)
+        gojig.use_library = False
+        gojig.compile_cache.cache_clear()
+        self.assertEqual(gojig.compile(teal=teal), result)
+
+    def test_compile_cache(self):
+        teal = b'#pragma version 8\nint 1\n'
+        gojig.compile_cache.cache_clear()
+        with mock.patch.object(gojig, '_compile', return_value=(b'\x08\x81\x01', b'{"mappings": ""}')) as compile:
+            program, sourcemap = gojig.compile(teal=teal.decode())
+            self.assertEqual(program, b'\x08\x81\x01')
+            sourcemap['mappings'] = 'x'
+            self.assertEqual(gojig.compile(teal=teal)[1], {'mappings': ''})
+            self.assertEqual(compile.call_count, 1)
+            # the cache is bounded so the first program is compiled again after enough others
+            for i in range(gojig.COMPILE_CACHE_SIZE):
+                gojig.compile(teal=teal + b'int %d\n' % i)
+            gojig.compile(teal=teal)
+            self.assertEqual(compile.call_count, gojig.COMPILE_CACHE_SIZE + 2)
+        gojig.compile_cache.cache_clear()
+
+    def test_set_library_verified_cache(self):
+        gojig._library_verified_cache = None
+        with mock.patch.object(gojig, 'call_library', return_value=(0, b'')) as call_library:
+            gojig.set_library_verified_cache('')
+            gojig.set_library_verified_cache('/tmp/verified.bin')
+            gojig.set_library_verified_cache('/tmp/verified.bin')
+            gojig.set_library_verified_cache('')
+        self.assertEqual([c.args[1] for c in call_library.call_args_list], [b'', b'/tmp/verified.bin', b''])
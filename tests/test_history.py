@@ -0,0 +1,56 @@
+import base64
+import unittest
+
+from algojig import generate_accounts, get_suggested_params
+from algojig.history import HistoryStore
+from algosdk.encoding import msgpack, msgpack_encode
+from algosdk.transaction import AssetCreateTxn, PaymentTxn
+
+secrets, addresses = generate_accounts(2)
+sp = get_suggested_params()
+
+
+def block_stxn(stxn):
+    """Encode a signed transaction the way it appears in an evaluated block."""
+    stxn = msgpack.unpackb(base64.b64decode(msgpack_encode(stxn)), raw=True)
+    del stxn[b'txn'][b'gh']
+    stxn[b'hgh'] = True
+    if stxn[b'txn'].pop(b'gen', None):
+        stxn[b'hgi'] = True
+    return stxn
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.history = HistoryStore()
+
+    def tearDown(self):
+        self.history.close()
+
+    def test_add_and_query(self):
+        pay = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=1).sign(secrets[0])
+        acfg = AssetCreateTxn(addresses[1], sp, 100, 0, False, unit_name='U', asset_name='Asset', url='https://x')
+        acfg = acfg.sign(secrets[1])
+        call = block_stxn(pay)
+        call[b'txn'] = {b'type': b'appl', b'snd': call[b'txn'][b'snd'], b'apid': 5, b'fee': 1000, b'fv': 1, b'lv': 2}
+        inner = {b'txn': {b'type': b'pay', b'snd': b'\x01' * 32, b'rcv': call[b'txn'][b'snd'], b'amt': 3}}
+        call[b'dt'] = {b'lg': [b'log1'], b'itx': [inner]}
+        gh = base64.b64decode(sp.gh)
+        self.history.add_block({b'rnd': 2, b'gh': gh, b'gen': (sp.gen or '').encode(), b'txns': [block_stxn(pay), block_stxn(acfg)]})
+        self.history.add_block({b'rnd': 2, b'gh': gh, b'gen': (sp.gen or '').encode(), b'txns': [call]})
+        self.assertEqual(len(self.history), 2)
+
+        record = self.history.get_transaction(pay.get_txid())
+        self.assertEqual((record.block_index, record.path), (1, (0,)))
+        self.assertEqual(record.stxn[b'txn'][b'amt'], 1)
+        self.assertEqual(self.history.get_transaction(acfg.get_txid()).path, (1,))
+
+        calls = self.history.find_transactions(app_id=5)
+        self.assertEqual([(r.block_index, r.path, r.logs) for r in calls], [(2, (0,), [b'log1'])])
+        self.assertNotIn(b'itx', calls[0].stxn[b'dt'])
+        received = self.history.find_transactions(receiver=addresses[0])
+        self.assertEqual([(r.path, r.txid) for r in received], [((0, 0), None)])
+        self.assertEqual(len(self.history.find_transactions(sender=addresses[0])), 2)
+        self.assertEqual(len(self.history.find_transactions(sender=addresses[0], type='pay')), 1)
+        self.assertEqual(self.history.get_block_header(2)[b'rnd'], 2)
@@ -0,0 +1,35 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+# Budget for the cumulative import time of the algojig package, in microseconds.
+# Wall-clock checks depend on the machine so they only run with ALGOJIG_BENCHMARK=1.
+IMPORT_TIME_BUDGET = 20_000
+BENCHMARK = os.environ.get('ALGOJIG_BENCHMARK') == '1'
+
+
+class TestImport(unittest.TestCase):
+
+    def run_python(self, *args):
+        return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+
+    def test_import_is_lazy(self):
+        modules = ['algosdk', 'algojig.ledger', 'algojig.teal', 'algojig.tealish', 'pprint']
+        code = f'import sys, algojig; print([m for m in {modules!r} if m in sys.modules])'
+        output = self.run_python('-c', code)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+    def test_lazy_names(self):
+        code = 'from algojig import JigLedger, TealProgram, LogicEvalError; import algojig; print(algojig.JigLedger.__module__)'
+        output = self.run_python('-c', code)
+        self.assertEqual(output.stdout.strip(), 'algojig.ledger')
+
+    @unittest.skipUnless(BENCHMARK, 'benchmarks run with ALGOJIG_BENCHMARK=1')
+    def test_import_time_budget(self):
+        output = self.run_python('-X', 'importtime', '-c', 'import algojig')
+        # import time: self [us] | cumulative | imported package
+        times = re.findall(r'import time:\s+\d+ \|\s+(\d+) \| algojig$', output.stderr, re.MULTILINE)
+        self.assertEqual(len(times), 1)
+        self.assertLess(int(times[0]), IMPORT_TIME_BUDGET)
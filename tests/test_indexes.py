@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+from algojig import JigLedger, generate_accounts
+from algojig.boxes import SqliteBoxStore
+from algojig.indexes import Column, prefix_end
+from algojig.teal import TealProgram
+from algosdk.encoding import decode_address
+
+secrets, addresses = generate_accounts(3)
+
+
+class FakeProgram(TealProgram):
+    def __init__(self):
+        super().__init__(bytecode=b'\x06\x81\x01')
+
+
+class TestIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = JigLedger()
+
+    def test_asset_holders(self):
+        self.ledger.create_asset(10)
+        self.ledger.set_account_balance(addresses[0], 5, asset_id=10)
+        self.ledger.opt_in_asset(addresses[1], 10)
+        self.assertEqual(self.ledger.get_asset_holder_addresses(10), sorted([self.ledger.creator, *addresses[:2]]))
+        self.assertEqual(self.ledger.get_asset_holder_addresses(10, min_balance=1),
+                         sorted([self.ledger.creator, addresses[0]]))
+        # update_accounts replaces the holdings of the account
+        self.ledger.update_accounts({addresses[0]: {b'algo': 1_000_000}})
+        self.assertNotIn(addresses[0], self.ledger.get_asset_holder_addresses(10))
+        self.assertIn(addresses[0], self.ledger.get_asset_holder_addresses(0))
+
+    def test_opted_in_accounts(self):
+        self.ledger.create_app(7, approval_program=FakeProgram())
+        for a in addresses:
+            self.ledger.set_account_balance(a, 1_000_000)
+        self.ledger.set_local_state(addresses[0], 7, {})
+        self.ledger.set_local_state(addresses[2], 7, {b'a': 1})
+        self.assertEqual(self.ledger.get_opted_in_addresses(7), sorted([addresses[0], addresses[2]]))
+        self.ledger.set_local_state(addresses[0], 7, None)
+        self.assertEqual(self.ledger.get_opted_in_addresses(7), [addresses[2]])
+        self.ledger.update_accounts({addresses[1]: {b'algo': 1, b'appl': {7: {b'tkv': {}}}}})
+        self.assertEqual(self.ledger.get_opted_in_addresses(7), sorted([addresses[1], addresses[2]]))
+        self.assertEqual(self.ledger.get_opted_in_addresses(8), [])
+
+    def test_rekeyed_accounts(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        self.ledger.set_auth_addr(addresses[0], addresses[2])
+        self.ledger.update_accounts({addresses[1]: {b'algo': 1, b'spend': decode_address(addresses[2])}})
+        self.assertEqual(self.ledger.get_rekeyed_addresses(addresses[2]), sorted(addresses[:2]))
+        self.ledger.set_auth_addr(addresses[0], addresses[1])
+        self.assertEqual(self.ledger.get_rekeyed_addresses(addresses[2]), [addresses[1]])
+        self.assertEqual(self.ledger.get_rekeyed_addresses(addresses[1]), [addresses[0]])
+
+    def test_update_cost_does_not_grow_with_account(self):
+        for asset_id in range(1, 201):
+            self.ledger.create_asset(asset_id)
+        self.ledger.create_app(7, approval_program=FakeProgram())
+        self.ledger.set_local_state(self.ledger.creator, 7, {bytes([i]): i for i in range(16)})
+        with mock.patch.object(Column, 'set', autospec=True, side_effect=Column.set) as column_set:
+            self.ledger.set_account_balance(self.ledger.creator, 5, asset_id=1)
+            self.ledger.update_local_state(self.ledger.creator, 7, {b'\x00': 1})
+        self.assertEqual(column_set.call_count, 2)
+        self.assertEqual(self.ledger.get_asset_holder_addresses(1, min_balance=6), [])
+
+    def test_column(self):
+        column = Column('Q')
+        for i, address in enumerate(addresses):
+            column.set(address, i)
+        column.remove(addresses[0])
+        column.set(addresses[2], 5)
+        self.assertEqual(dict(zip(column.addresses, column.values)), {addresses[1]: 1, addresses[2]: 5})
+        self.assertEqual(column.positions, {a: i for i, a in enumerate(column.addresses)})
+        column = Column()
+        column.set(addresses[0], b'x')
+        column.set(addresses[1], 1)
+        self.assertEqual(column.non_ints, 1)
+        column.set(addresses[0], 2)
+        self.assertEqual(column.non_ints, 0)
+
+    def test_prefix_end(self):
+        self.assertEqual(prefix_end(b'user'), b'uses')
+        self.assertEqual(prefix_end(b'a\xff'), b'b')
+        self.assertIsNone(prefix_end(b'\xff'))
+
+
+class TestBoxKeys(unittest.TestCase):
+
+    def test_box_keys(self):
+        box_store = SqliteBoxStore()
+        self.addCleanup(box_store.close)
+        for ledger in (JigLedger(), JigLedger(box_store=box_store)):
+            with self.subTest(box_store=type(ledger.boxes).__name__):
+                for key in [b'user_b', b'pool', b'user_a', b'user\xff', b'usf', b'config']:
+                    ledger.set_box(1, key, b'x')
+                ledger.set_box(2, b'user_c', b'x')
+                self.assertEqual(ledger.get_box_keys(1),
+                                 [b'config', b'pool', b'user_a', b'user_b', b'user\xff', b'usf'])
+                self.assertEqual(ledger.get_box_keys(1, prefix=b'user'), [b'user_a', b'user_b', b'user\xff'])
+                self.assertEqual(ledger.get_box_keys(1, start=b'p', end=b'user_b'), [b'pool', b'user_a'])
+                ledger.delete_box(1, b'user_a')
+                self.assertEqual(ledger.get_box_keys(1, prefix=b'user_'), [b'user_b'])
@@ -1,8 +1,12 @@
+import sqlite3
 import unittest
+from unittest import mock
 
-from algojig import JigLedger, generate_accounts, get_suggested_params
+from algojig import JigLedger, generate_accounts, get_suggested_params, gojig
+from algojig.exceptions import EvalError
+from algojig.history import HistoryStore
 from algojig.teal import TealProgram
-from algosdk.transaction import (ApplicationNoOpTxn, AssetTransferTxn,
+from algosdk.transaction import (ApplicationNoOpTxn, AssetConfigTxn, AssetTransferTxn,
                                         LogicSigAccount, LogicSigTransaction,
                                         PaymentTxn, assign_group_id)
 
@@ -50,6 +54,39 @@ class TestDebug(unittest.TestCase):
             self.ledger.eval_transactions(transactions)
         self.assertIn('overspend', e.exception.args[0])
 
+    def test_eval_independent_groups(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        groups = [
+            [PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=200_000).sign(secrets[0])],
+            # overspend
+            [PaymentTxn(sender=addresses[1], sp=sp, receiver=addresses[0], amt=10_000_000).sign(secrets[1])],
+            # wrong signer
+            [PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=1).sign(secrets[1])],
+            [PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=300_000).sign(secrets[0])],
+        ]
+        block, statuses = self.ledger.eval_independent_groups(groups)
+        self.assertEqual(len(block[b'txns']), 2)
+        self.assertIsNone(statuses[0])
+        self.assertIn('overspend', statuses[1].args[0])
+        self.assertIn('verify', statuses[2].args[0])
+        self.assertIsNone(statuses[3])
+        self.assertEqual(self.ledger.get_account_balance(addresses[1])[0], 500_000)
+
+    def test_eval_independent_groups_bad_groups(self):
+        txns = [PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=i) for i in range(3)]
+        grouped = assign_group_id(txns[:2])
+        bad_groups = [
+            # ungrouped transactions in one group
+            [[txns[2].sign(secrets[0]), txns[2].sign(secrets[0])]],
+            # a transaction group split in two
+            [[grouped[0].sign(secrets[0])], [grouped[1].sign(secrets[0])]],
+        ]
+        with mock.patch.object(JigLedger, '_run') as run:
+            for groups in bad_groups:
+                with self.assertRaises(ValueError):
+                    self.ledger.eval_independent_groups(groups)
+        run.assert_not_called()
+
     def test_fail_fee(self):
         self.ledger.set_account_balance(addresses[0], 1_000_000)
         transactions = [
@@ -116,6 +153,47 @@ class TestDebug(unittest.TestCase):
         block = self.ledger.eval_transactions(stxns)
         self.assertEqual(len(block[b'txns']), 2)
 
+    def test_simulate_alternatives_errors(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        stxn = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=1).sign(secrets[0])
+        with mock.patch.object(JigLedger, '_prepare'), mock.patch.object(gojig, 'save_ledger'), \
+                mock.patch.object(gojig, 'restore_ledger'), mock.patch.object(gojig, 'eval') as eval:
+            eval.side_effect = [EvalError('overspend'), EvalError('overspend')]
+            results = self.ledger.simulate_alternatives([[stxn], [stxn]])
+            self.assertEqual([r.args[0] for r in results], ['overspend', 'overspend'])
+            # errors that aren't eval results are raised instead of being reported as rejected alternatives
+            eval.side_effect = [EvalError('overspend'), sqlite3.OperationalError('database is locked')]
+            with self.assertRaises(sqlite3.OperationalError):
+                self.ledger.simulate_alternatives([[stxn], [stxn]])
+
+    def test_pass_block_timestamp(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        # logs the timestamp of the previous block (round 1) as read through the ledger's header cache
+        self.ledger.create_app(11, approval_program=TealProgram(
+            teal='#pragma version 7\nint 1\nblock BlkTimestamp\nitob\nlog\ntxn FirstValidTime\nitob\nlog\nint 1'
+        ))
+        call_sp = get_suggested_params()
+        call_sp.first = 2
+        for block_timestamp in [2000, 3000]:
+            txn = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[0], amt=block_timestamp)
+            call = ApplicationNoOpTxn(addresses[0], call_sp, 11, note=str(block_timestamp).encode())
+            block = self.ledger.eval_transactions([txn.sign(secrets[0]), call.sign(secrets[0])],
+                                                  block_timestamp=block_timestamp)
+            # the block time is at most 25 seconds after the previous block
+            self.assertTrue(block_timestamp <= block[b'ts'] <= block_timestamp + 25)
+            self.assertEqual(block[b'txns'][1][b'dt'][b'lg'], [block_timestamp.to_bytes(8, 'big')] * 2)
+
+    def test_pass_history(self):
+        history = HistoryStore()
+        self.addCleanup(history.close)
+        self.ledger = JigLedger(history=history)
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        for amount in [1, 2]:
+            stxn = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=amount).sign(secrets[0])
+            self.ledger.eval_transactions([stxn])
+        self.assertEqual(history.get_transaction(stxn.get_txid()).block_index, 2)
+        self.assertEqual(len(history.find_transactions(receiver=addresses[1])), 2)
+
     def test_fail_wrong_auth(self):
         transactions = [
             PaymentTxn(
@@ -301,3 +379,124 @@ class TestDebug(unittest.TestCase):
 
         block = self.ledger.eval_transactions(transactions)
         self.assertEqual(len(block[b'txns']), 1)
+
+    def test_pass_asset_config_by_manager(self):
+        # only the creator's asset params resource changes, not any account the transaction references
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        self.ledger.set_account_balance(addresses[1], 1_000_000)
+        self.ledger.create_asset(10, {'creator': addresses[0], 'manager': addresses[1], 'reserve': addresses[0]})
+        transactions = [
+            AssetConfigTxn(
+                sender=addresses[1],
+                sp=sp,
+                index=10,
+                manager=addresses[1],
+                reserve=addresses[2],
+                strict_empty_address_check=False,
+            ).sign(secrets[1]),
+        ]
+        self.ledger.eval_transactions(transactions)
+        self.assertEqual(self.ledger.assets[10]['reserve'], addresses[2])
+
+    def test_pass_large_ids(self):
+        self.ledger.creator_sk, self.ledger.creator = secrets[0], addresses[0]
+        self.ledger.set_account_balance(addresses[0], 10_000_000)
+        self.ledger.set_account_balance(addresses[0], 1_000, asset_id=1_002_541_853)
+        self.ledger.set_account_balance(addresses[1], 1_000_000)
+        self.ledger.set_account_balance(addresses[1], 0, asset_id=1_002_541_853)
+        self.ledger.create_app(1_002_541_000, approval_program=TealProgram(teal='#pragma version 6\nint 1'))
+        transactions = [
+            AssetTransferTxn(
+                sender=addresses[0],
+                sp=sp,
+                receiver=addresses[1],
+                amt=100,
+                index=1_002_541_853,
+            ).sign(secrets[0]),
+            ApplicationNoOpTxn(
+                sender=addresses[0],
+                sp=sp,
+                index=1_002_541_000
+            ).sign(secrets[0]),
+        ]
+        block = self.ledger.eval_transactions(transactions)
+        self.assertEqual(len(block[b'txns']), 2)
+        self.assertEqual(self.ledger.get_account_balance(addresses[1], asset_id=1_002_541_853)[0], 100)
+
+    def test_pass_eval_transaction_groups(self):
+        self.ledger.set_account_balance(addresses[0], 10_000_000)
+
+        def groups():
+            for i in range(10):
+                yield [
+                    PaymentTxn(
+                        sender=addresses[0],
+                        sp=sp,
+                        receiver=addresses[1],
+                        amt=100_000 + i,
+                    ).sign(secrets[0]),
+                ]
+
+        blocks = list(self.ledger.eval_transaction_groups(groups(), max_block_bytes=1000))
+        self.assertGreater(len(blocks), 1)
+        self.assertEqual(sum(len(groups) for groups, _ in blocks), 10)
+        self.assertEqual(sum(len(block[b'txns']) for _, block in blocks), 10)
+        self.assertEqual(self.ledger.get_account_balance(addresses[1])[0], 1_000_045)
+
+    def test_eval_transaction_groups_no_space(self):
+        def eval_transactions(transactions, block_timestamp=None):
+            if len(transactions) > 2:
+                raise EvalError('transaction X: block does not have space for transaction')
+            return {b'txns': transactions}
+
+        groups = [[b'a'], [b'b'], [b'c'], [b'd'], [b'e']]
+        with mock.patch.object(self.ledger, 'eval_transactions', side_effect=eval_transactions):
+            blocks = list(self.ledger.eval_transaction_groups(groups))
+        self.assertEqual([block_groups for block_groups, _ in blocks], [groups[:2], groups[2:3], groups[3:]])
+
+    def test_pass_eval_transaction_groups_apply_data_size(self):
+        # Every call logs 1024 bytes so the apply data of the calls exceeds MaxTxnBytesPerBlock
+        # although the encoded transactions fit in a block.
+        self.ledger.set_account_balance(addresses[0], 100_000_000)
+        self.ledger.create_app(11, approval_program=TealProgram(teal='#pragma version 6\nint 1024\nbzero\nlog\nint 1'))
+        n = 6000
+        groups = ([ApplicationNoOpTxn(addresses[0], sp, 11, note=str(i).encode()).sign(secrets[0])] for i in range(n))
+        blocks = list(self.ledger.eval_transaction_groups(groups))
+        self.assertGreater(len(blocks), 1)
+        self.assertEqual(sum(len(block[b'txns']) for _, block in blocks), n)
+
+    def test_simulate_alternatives(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        alternatives = [
+            [
+                PaymentTxn(
+                    sender=addresses[0],
+                    sp=sp,
+                    receiver=addresses[1],
+                    amt=amount,
+                ).sign(secrets[0]),
+            ]
+            for amount in [100_000, 200_000, 2_000_000]
+        ]
+        results = self.ledger.simulate_alternatives(alternatives)
+        self.assertEqual(len(results[0]['block'][b'txns']), 1)
+        self.assertEqual(len(results[1]['block'][b'txns']), 1)
+        self.assertIn('overspend', results[2].args[0])
+        # the ledger state is unchanged
+        self.assertEqual(self.ledger.get_account_balance(addresses[0])[0], 1_000_000)
+        self.assertEqual(self.ledger.get_account_balance(addresses[1])[0], 0)
+
+    def test_last_delta(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        transactions = [
+            PaymentTxn(
+                sender=addresses[0],
+                sp=sp,
+                receiver=addresses[1],
+                amt=200_000,
+            ).sign(secrets[0]),
+        ]
+        self.ledger.eval_transactions(transactions)
+        delta = self.ledger.last_delta
+        self.assertEqual(delta.get_balance_change(addresses[0]), -201_000)
+        self.assertEqual(delta.balances[(addresses[1], 0)], (None, 200_000))
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+from algojig import JigLedger, generate_accounts, get_suggested_params
+from algojig.history import HistoryStore
+from algojig.replay import Replay, write_recording
+from algosdk.transaction import PaymentTxn
+
+secrets, addresses = generate_accounts(2)
+sp = get_suggested_params()
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'recording.msgpack')
+        self.checkpoint_dir = os.path.join(self.dir.name, 'checkpoints')
+        self.ledger = JigLedger()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_iter_blocks(self):
+        write_recording(self.filename, [
+            (1000, [b'a', b'b']),
+            (1000, [b'c']),
+            (1010, [b'd']),
+            (1010, [b'e' * 10]),
+            (1020, [b'f']),
+        ])
+        replay = Replay(self.ledger, self.filename, max_block_bytes=10)
+        blocks = list(replay.iter_blocks())
+        self.assertEqual([b.txns for b in blocks], [[b'a', b'b', b'c'], [b'd'], [b'e' * 10], [b'f']])
+        self.assertEqual([(b.position, b.end_position, b.timestamp) for b in blocks], [
+            (0, 2, 1000), (2, 3, 1010), (3, 4, 1010), (4, 5, 1020),
+        ])
+        # resume from the end of the second block
+        rest = list(replay.iter_blocks(blocks[1].end_position, blocks[1].end_offset))
+        self.assertEqual(rest, blocks[2:])
+
+    def test_checkpoint(self):
+        write_recording(self.filename, [])
+        replay = Replay(self.ledger, self.filename, checkpoint_dir=self.checkpoint_dir)
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        self.ledger.set_box(1, b'a', b'x')
+        h = self.ledger.state_hash()
+        replay.save_checkpoint(5, 100)
+        self.ledger.set_account_balance(addresses[0], 2_000_000)
+        self.ledger.delete_box(1, b'a')
+        self.ledger.set_box(1, b'b', b'y')
+        self.assertEqual(replay.list_checkpoints(), [(5, 100)])
+        self.assertEqual(replay.restore_checkpoint(5, 100), (5, 100))
+        self.assertEqual(self.ledger.get_account_balance(addresses[0]), [1_000_000, False])
+        self.assertEqual(self.ledger.get_box(1, b'a'), b'x')
+        self.assertFalse(self.ledger.box_exists(1, b'b'))
+        self.assertEqual(self.ledger.state_hash(), h)
+
+    def test_checkpoint_state_provider_keys(self):
+        write_recording(self.filename, [])
+        replay = Replay(self.ledger, self.filename, checkpoint_dir=self.checkpoint_dir)
+        replay.save_checkpoint(0, 0)
+        # state loaded from a state provider after the checkpoint
+        self.ledger.provided.add(('account', addresses[0]))
+        self.ledger.unloaded_box_stats[1] = [1, 10]
+        replay.restore_checkpoint(0, 0)
+        self.assertEqual(self.ledger.provided, set())
+        self.assertEqual(self.ledger.unloaded_box_stats, {})
+
+    def test_checkpoint_history(self):
+        write_recording(self.filename, [])
+        self.ledger.history = HistoryStore()
+        self.addCleanup(self.ledger.history.close)
+        replay = Replay(self.ledger, self.filename, checkpoint_dir=self.checkpoint_dir)
+        self.ledger.history.add_block({b'rnd': 2, b'txns': []})
+        replay.save_checkpoint(1, 10)
+        self.ledger.history.add_block({b'rnd': 2, b'txns': []})
+        replay.restore_checkpoint(1, 10)
+        self.assertEqual(len(self.ledger.history), 1)
+        self.assertEqual(self.ledger.history.add_block({b'rnd': 2, b'txns': []}), 2)
+
+    def test_pass_run_resume_bisect(self):
+        self.ledger.set_account_balance(addresses[0], 10_000_000)
+        records = []
+        for i in range(6):
+            txn = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=1_000_000, note=bytes([i]))
+            records.append((1000 + i * 10, [txn.sign(secrets[0])]))
+        write_recording(self.filename, records)
+
+        replay = Replay(self.ledger, self.filename, checkpoint_dir=self.checkpoint_dir, checkpoint_interval=2)
+        stats = replay.run(stop=4)
+        self.assertEqual(len(stats.blocks), 4)
+        self.assertEqual(replay.list_checkpoints()[-1][0], 4)
+        stats = replay.run(resume=True)
+        self.assertEqual(len(stats.blocks), 2)
+        self.assertEqual(self.ledger.get_account_balance(addresses[1])[0], 6_000_000)
+
+        block = replay.bisect(lambda ledger: ledger.get_account_balance(addresses[1])[0] >= 3_000_000)
+        self.assertEqual(block.position, 2)
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+from algojig import JigLedger, generate_accounts, get_suggested_params
+from algojig.ledger import get_footprint
+from algojig.snapshot import SnapshotStateProvider, save_snapshot
+from algojig.teal import TealProgram
+from algosdk.logic import get_application_address
+from algosdk.transaction import ApplicationNoOpTxn, AssetTransferTxn, PaymentTxn
+
+sp = get_suggested_params()
+secrets, addresses = generate_accounts(4)
+
+
+class FakeProgram(TealProgram):
+    def __init__(self):
+        super().__init__(bytecode=b'\x06\x81\x01')
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        ledger = JigLedger()
+        for address in addresses:
+            ledger.set_account_balance(address, 1_000_000)
+        ledger.create_asset(10, {'creator': addresses[3], 'total': 1000})
+        ledger.opt_in_asset(addresses[1], 10)
+        ledger.create_app(20, approval_program=FakeProgram(), creator=addresses[3])
+        ledger.set_global_state(20, {b'a': 1})
+        ledger.set_local_state(addresses[2], 20, {b'b': b'x'})
+        ledger.set_box(20, b'k1', b'123')
+        ledger.set_box(20, b'k2', b'4567')
+        save_snapshot(ledger, self.filename)
+        self.provider = SnapshotStateProvider(self.filename)
+        self.ledger = JigLedger(state_provider=self.provider)
+
+    def tearDown(self):
+        self.provider.close()
+        os.remove(self.filename)
+
+    def test_provider(self):
+        self.assertEqual(self.provider.get_account(addresses[1])['balances'], {0: [1_000_000, False], 10: [0, False]})
+        self.assertIsNone(self.provider.get_account(generate_accounts(1)[1][0]))
+        self.assertEqual(self.provider.get_asset(10)['total'], 1000)
+        app, global_state = self.provider.get_app(20)
+        self.assertEqual(app['approval_program_bytecode'], b'\x06\x81\x01')
+        self.assertEqual(global_state, {b'a': 1})
+        self.assertEqual(self.provider.get_box(20, b'k2'), b'4567')
+        self.assertEqual(tuple(self.provider.get_box_stats(20)), (2, 11))
+        self.assertEqual(self.provider.get_max_creatable_id(), 20)
+
+    def test_load_payment(self):
+        self.ledger.load_state([PaymentTxn(addresses[0], sp, addresses[1], 1).sign(secrets[0])])
+        self.assertEqual(self.ledger.get_account_balance(addresses[0]), [1_000_000, False])
+        self.assertEqual(self.ledger.get_account_balance(addresses[1], 10), [0, False])
+        # only the accessed accounts and the assets they hold are loaded
+        self.assertNotIn(addresses[2], self.ledger.accounts)
+        self.assertNotIn(addresses[3], self.ledger.accounts)
+        self.assertIn(10, self.ledger.assets)
+
+    def test_load_asset_transfer(self):
+        self.ledger.load_state([AssetTransferTxn(addresses[0], sp, addresses[1], 1, 10)])
+        # the creator holds the asset params
+        self.assertIn(addresses[3], self.ledger.accounts)
+
+    def test_load_app_call(self):
+        txn = ApplicationNoOpTxn(addresses[2], sp, 20, boxes=[(0, b'k1'), (0, b'missing')])
+        self.ledger.load_state([txn])
+        self.assertEqual(self.ledger.get_global_state(20), {b'a': 1})
+        self.assertEqual(self.ledger.get_local_state(addresses[2], 20), {b'b': b'x'})
+        self.assertEqual(bytes(self.ledger.get_box(20, b'k1')), b'123')
+        self.assertFalse(self.ledger.box_exists(20, b'k2'))
+        self.assertIn(addresses[3], self.ledger.accounts)
+        self.assertEqual(self.ledger.unloaded_box_stats[20], [1, 6])
+
+    def test_loaded_state_is_kept(self):
+        txn = PaymentTxn(addresses[0], sp, addresses[1], 1)
+        self.ledger.load_state([txn])
+        self.ledger.set_account_balance(addresses[0], 5)
+        self.ledger.load_state([txn])
+        self.assertEqual(self.ledger.get_account_balance(addresses[0]), [5, False])
+
+    def test_footprint(self):
+        txn = ApplicationNoOpTxn(addresses[0], sp, 20, accounts=[addresses[1]], foreign_apps=[30],
+                                 foreign_assets=[10], boxes=[(30, b'x')])
+        found_addresses, apps, assets, boxes = get_footprint([txn])
+        self.assertEqual(found_addresses, {
+            addresses[0], addresses[1], get_application_address(20), get_application_address(30)
+        })
+        self.assertEqual(apps, {20, 30})
+        self.assertEqual(assets, {10})
+        self.assertEqual(boxes, {(30, b'x')})
@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+
+from algojig import JigLedger, generate_accounts
+from algojig.boxes import SqliteBoxStore, box_kv_key
+from algojig import statehash
+from algojig.statehash import StateHash
+from algojig.teal import TealProgram
+from algosdk.encoding import decode_address
+
+secrets, addresses = generate_accounts(2)
+
+
+class FakeProgram(TealProgram):
+    def __init__(self):
+        super().__init__(bytecode=b'\x06\x81\x01')
+
+
+class TestStateHash(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = JigLedger()
+
+    def test_balance_change(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        h = self.ledger.state_hash()
+        self.ledger.set_account_balance(addresses[0], 2_000_000)
+        self.assertNotEqual(self.ledger.state_hash(), h)
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        self.assertEqual(self.ledger.state_hash(), h)
+
+    def test_order_independent(self):
+        a = StateHash()
+        a.set(('account', 1), [1])
+        a.set(('account', 2), [2])
+        a.add(('box', 1), b'x')
+        b = StateHash()
+        b.add(('box', 1), b'x')
+        b.set(('account', 2), [2])
+        b.set(('account', 1), [0])
+        self.assertNotEqual(a.hexdigest(), b.hexdigest())
+        b.set(('account', 1), [1])
+        self.assertEqual(a.hexdigest(), b.hexdigest())
+
+    def test_boxes(self):
+        h = self.ledger.state_hash()
+        self.ledger.set_box(1, b'a', b'1')
+        self.assertNotEqual(self.ledger.state_hash(), h)
+        self.ledger.set_box(1, b'a', b'2')
+        h2 = self.ledger.state_hash()
+        self.ledger.delete_box(1, b'a')
+        self.assertEqual(self.ledger.state_hash(), h)
+        self.ledger.update_boxes({box_kv_key(1, b'a'): b'2'})
+        self.assertEqual(self.ledger.state_hash(), h2)
+        self.ledger.update_boxes({box_kv_key(1, b'a'): None})
+        self.assertEqual(self.ledger.state_hash(), h)
+
+    def test_sqlite_box_store(self):
+        ledger = JigLedger(box_store=SqliteBoxStore())
+        h = ledger.state_hash()
+        ledger.set_box(1, b'a', b'1')
+        ledger.set_box(1, b'a', b'2')
+        ledger.delete_box(1, b'a')
+        self.assertEqual(ledger.state_hash(), h)
+
+    def test_app_state(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        self.ledger.create_app(1, approval_program=FakeProgram())
+        self.ledger.set_global_state(1, {b'a': 1})
+        self.ledger.set_local_state(addresses[0], 1, {b'b': b'x'})
+        h = self.ledger.state_hash()
+        self.ledger.update_global_state(1, {b'a': 2})
+        self.assertNotEqual(self.ledger.state_hash(), h)
+        self.ledger.update_global_state(1, {b'a': 1})
+        self.ledger.update_local_state(addresses[0], 1, {b'b': b'y'})
+        self.assertNotEqual(self.ledger.state_hash(), h)
+        self.ledger.update_local_state(addresses[0], 1, {b'b': b'x'})
+        self.assertEqual(self.ledger.state_hash(), h)
+
+    def test_opt_in(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        h = self.ledger.state_hash()
+        self.ledger.set_local_state(addresses[0], 1, {})
+        self.assertNotEqual(self.ledger.state_hash(), h)
+        self.ledger.set_local_state(addresses[0], 1, None)
+        self.assertEqual(self.ledger.state_hash(), h)
+
+    def test_setter_hashes_only_the_changed_item(self):
+        for asset_id in range(1, 201):
+            self.ledger.create_asset(asset_id)
+        with mock.patch.object(statehash, 'hash_item', side_effect=statehash.hash_item) as hash_item:
+            self.ledger.set_account_balance(self.ledger.creator, 5, asset_id=1)
+        self.assertEqual(hash_item.call_count, 1)
+
+    def test_update_accounts(self):
+        self.ledger.set_account_balance(addresses[0], 1_000_000)
+        h = self.ledger.state_hash()
+        self.ledger.update_accounts({addresses[0]: {b'algo': 900_000}})
+        self.assertNotEqual(self.ledger.state_hash(), h)
+        self.ledger.update_accounts({addresses[0]: {b'algo': 1_000_000}})
+        self.assertEqual(self.ledger.state_hash(), h)
+        self.ledger.update_accounts({addresses[0]: {b'algo': 1_000_000, b'spend': decode_address(addresses[1])}})
+        self.assertNotEqual(self.ledger.state_hash(), h)
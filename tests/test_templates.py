@@ -0,0 +1,56 @@
+import base64
+import unittest
+
+from algojig import generate_accounts, get_suggested_params
+from algojig.templates import TransactionTemplate
+from algosdk.encoding import msgpack_encode
+from algosdk.transaction import ApplicationNoOpTxn, PaymentTxn, assign_group_id
+
+secrets, addresses = generate_accounts(3)
+sp = get_suggested_params()
+
+
+def encode(stxn):
+    return base64.b64decode(msgpack_encode(stxn))
+
+
+class TestTransactionTemplate(unittest.TestCase):
+
+    def make_group(self, amount, receiver, app_arg):
+        txns = [
+            PaymentTxn(sender=addresses[0], sp=sp, receiver=receiver, amt=amount),
+            ApplicationNoOpTxn(sender=addresses[1], sp=sp, index=7, app_args=[app_arg]),
+        ]
+        return assign_group_id(txns)
+
+    def test_render_matches_algosdk(self):
+        template = TransactionTemplate(self.make_group(1, addresses[1], b'a'), secrets=[secrets[0], secrets[1]])
+        for amount, receiver, app_arg in [(1, addresses[1], b'a'), (0, addresses[2], b'b'), (10**12, addresses[0], b'')]:
+            txns = self.make_group(amount, receiver, app_arg)
+            expected = [encode(txns[0].sign(secrets[0])), encode(txns[1].sign(secrets[1]))]
+            stxns = template.render({'amt': amount, 'rcv': receiver}, {'apaa': [app_arg]})
+            self.assertEqual(stxns, expected)
+
+    def test_unsigned(self):
+        txn = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=1)
+        template = TransactionTemplate([txn])
+        [stxn] = template.render({'note': b'x'})
+        txn.note = b'x'
+        self.assertEqual(stxn, encode({'txn': txn.dictify()}))
+
+    def test_rekeyed_sender(self):
+        txn = PaymentTxn(sender=addresses[0], sp=sp, receiver=addresses[1], amt=1)
+        template = TransactionTemplate([txn], secrets=[secrets[2]])
+        [variant] = template.render_many([({'amt': 2},)])
+        txn.amt = 2
+        self.assertEqual(variant, [encode(txn.sign(secrets[2]))])
+
+    def test_length_mismatch(self):
+        txns = self.make_group(1, addresses[1], b'a')
+        with self.assertRaises(ValueError):
+            TransactionTemplate(txns, secrets=[secrets[0]])
+        template = TransactionTemplate(txns, secrets=[secrets[0], secrets[1]])
+        with self.assertRaises(ValueError):
+            template.render({}, {}, {'amt': 2})
+        # missing patches leave the remaining transactions unchanged
+        self.assertEqual(template.render({'amt': 1}), template.render())